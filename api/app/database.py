@@ -46,6 +46,20 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for the heavy, read-only report queries.
+# Falls back to the primary when READ_REPLICA_URL is not set.
+READ_REPLICA_URL = os.getenv("READ_REPLICA_URL")
+if READ_REPLICA_URL and READ_REPLICA_URL.startswith("postgres://"):
+    READ_REPLICA_URL = READ_REPLICA_URL.replace("postgres://", "postgresql://", 1)
+
+read_engine = create_engine(READ_REPLICA_URL, **pool_settings) if READ_REPLICA_URL else engine
+
+# Open report transactions as READ ONLY on PostgreSQL
+if read_engine.dialect.name == "postgresql":
+    read_engine = read_engine.execution_options(postgresql_readonly=True)
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 # Base class for models
 Base = declarative_base()
 
@@ -59,13 +73,38 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database tables."""
-    from app import models  # Import models to register them
+def get_read_db():
+    """Dependency to get a read-only database session (replica if configured)."""
+    db = ReadSessionLocal()
     try:
-        Base.metadata.create_all(bind=engine, checkfirst=True)
-    except Exception as e:
-        # Tables/types may already exist, which is fine
-        print(f"Database init note: {e}")
+        yield db
+    finally:
+        db.close()
+
 
+# Whether init_db() migrates a database whose schema version is behind the
+# code (see app.migrate.migrate_if_needed). When the schema is current this
+# is a single query, so serverless cold starts stay cheap. Set to false to
+# leave all schema changes to "python -m app.migrate".
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
 
+# Set once init_db() has run in this process
+_db_initialized = False
+
+
+def init_db():
+    """
+    Initialize the database at startup.
+    
+    Runs once per process: the Vercel entry point calls it at import and
+    the app lifespan calls it again. With AUTO_MIGRATE set, migrates the
+    schema if its recorded version is behind (see app.migrate).
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
+    _db_initialized = True
+    
+    if AUTO_MIGRATE:
+        from app.migrate import migrate_if_needed
+        migrate_if_needed()
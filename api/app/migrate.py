@@ -0,0 +1,262 @@
+"""
+Database schema migrations.
+
+Run once per deploy, against the deploy's DATABASE_URL:
+
+    cd api && python -m app.migrate
+
+Every step is idempotent, so re-running it is safe. Instances also run
+it at startup when the database's recorded schema version is behind
+SCHEMA_VERSION (see migrate_if_needed and database.AUTO_MIGRATE), so a
+deploy that skipped the command still gets its new columns and tables.
+
+A database holding duplicate transactions (see DUPLICATE_TRANSACTIONS)
+only gets them reported; run once with --remove-duplicate-transactions
+to delete them so the import dedup index can be built.
+"""
+import argparse
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+
+from app.database import Base, engine, is_sqlite
+
+
+# Bump whenever a model or migration step changes, so the first instance
+# started on the new code migrates the database (see migrate_if_needed)
+SCHEMA_VERSION = 1
+
+# Session-level advisory lock key serializing startup migrations across
+# instances (PostgreSQL only)
+MIGRATION_LOCK_KEY = 727_001
+
+# Extension behind the trigram search index. Optional: without it the
+# transaction search still works, as a sequential ILIKE scan.
+TRGM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+# Expression indexes (PostgreSQL only), built CONCURRENTLY so existing
+# tables stay writable while they build.
+POSTGRES_INDEXES = {
+    # Trigram index backing the transaction list's free-text search. The
+    # expression must match transactions.SEARCH_TEXT exactly.
+    "ix_tx_search_trgm": """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tx_search_trgm ON transactions USING gin (
+            (coalesce(details, '') || ' ' || coalesce(particulars, '') || ' ' ||
+             coalesce(code, '') || ' ' || coalesce(reference, '')) gin_trgm_ops
+        )
+    """,
+    # Case-insensitive prefix lookups from find_similar_transactions
+    # (lower(col) LIKE 'prefix%').
+    "ix_tx_code_lower_prefix": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tx_code_lower_prefix "
+        "ON transactions (lower(code) text_pattern_ops)"
+    ),
+    "ix_tx_details_lower_prefix": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tx_details_lower_prefix "
+        "ON transactions (lower(details) text_pattern_ops)"
+    ),
+}
+
+# Import dedup key. confirm_upload inserts with ON CONFLICT DO NOTHING and
+# relies on this unique index to skip rows that already exist. The running
+# balance is part of the key so genuine repeat purchases (same day, amount
+# and merchant) are kept; only a re-exported row matches on it too. NULL
+# balances are coalesced so they compare equal, as in confirm_upload's
+# Python check.
+DEDUP_KEY = (
+    "account_id, transaction_date, amount, md5(coalesce(details, '')), "
+    "coalesce(balance, 'NaN'::double precision)"
+)
+DEDUP_INDEX = "ux_tx_import_dedup"
+DEDUP_INDEX_DDL = f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {DEDUP_INDEX} ON transactions ({DEDUP_KEY})"
+
+# Rows sharing a dedup key with another row, except the one copy kept:
+# a user-confirmed copy if there is one, else the first imported. Older
+# imports let repeated rows within a file through, and the unique index
+# can't be built while they exist.
+DUPLICATE_TRANSACTIONS = f"""
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY {DEDUP_KEY}
+            ORDER BY coalesce(is_user_confirmed, false) DESC, id
+        ) AS copy
+        FROM transactions
+    ) numbered
+    WHERE copy > 1
+"""
+
+
+def _execute_autocommit(statement: str):
+    """Run one statement outside a transaction block, as CONCURRENTLY requires."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(statement))
+
+
+def index_is_valid(name: str):
+    """True/False for an existing valid/invalid index, None if it doesn't exist."""
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"
+        ), {"name": name}).scalar()
+
+
+def _create_index_concurrently(name: str, statement: str):
+    """
+    Build an index with CREATE INDEX CONCURRENTLY.
+
+    A concurrent build that fails leaves an INVALID index behind, which
+    IF NOT EXISTS would then skip forever, so drop it and build again.
+    """
+    if index_is_valid(name) is False:
+        print(f"Rebuilding invalid index {name}")
+        _execute_autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    _execute_autocommit(statement)
+
+
+def create_dedup_index(remove_duplicates: bool = False):
+    """
+    Build the unique import dedup index, ux_tx_import_dedup.
+
+    Duplicate rows already in the table must go first. They are only
+    deleted when remove_duplicates is set (--remove-duplicate-transactions);
+    otherwise their count is reported and the index is left for a later
+    run. Until it exists, confirm_upload deduplicates in Python instead.
+    """
+    if index_is_valid(DEDUP_INDEX):
+        return
+
+    with engine.connect() as conn:
+        duplicates = conn.execute(
+            text(f"SELECT count(*) FROM ({DUPLICATE_TRANSACTIONS}) duplicate")
+        ).scalar()
+    if duplicates:
+        if not remove_duplicates:
+            print(
+                f"{duplicates} duplicate transactions prevent building {DEDUP_INDEX}. "
+                f"Re-run with --remove-duplicate-transactions to delete them "
+                f"(keeps one copy of each, preferring user-confirmed rows)."
+            )
+            return
+        with engine.begin() as conn:
+            removed = conn.execute(
+                text(f"DELETE FROM transactions WHERE id IN ({DUPLICATE_TRANSACTIONS})")
+            ).rowcount
+        print(f"Removed {removed} duplicate transactions")
+
+    _create_index_concurrently(DEDUP_INDEX, DEDUP_INDEX_DDL)
+
+
+def migrate_postgres(remove_duplicates: bool = False):
+    """PostgreSQL-only extensions and expression indexes."""
+    try:
+        _execute_autocommit(TRGM_EXTENSION)
+        has_trgm = True
+    except Exception as e:
+        print(f"pg_trgm unavailable, skipping ix_tx_search_trgm: {e}")
+        has_trgm = False
+
+    for name, statement in POSTGRES_INDEXES.items():
+        if "gin_trgm_ops" in statement and not has_trgm:
+            continue
+        _create_index_concurrently(name, statement)
+
+    create_dedup_index(remove_duplicates)
+
+
+def migrate(remove_duplicates: bool = False):
+    """Bring the database schema up to date with the models."""
+    from app import models  # Import models to register them
+    try:
+        Base.metadata.create_all(bind=engine, checkfirst=True)
+    except Exception as e:
+        # Tables/types may already exist, which is fine
+        print(f"Database init note: {e}")
+
+    # create_all() never alters existing tables, so add any nullable column
+    # declared on a model after its table was created
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            except Exception as e:
+                print(f"Database init note: {e}")
+
+    # create_all() only creates indexes together with a new table, so add
+    # any index declared on a model after its table already existed
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                print(f"Database init note: {e}")
+
+    if not is_sqlite:
+        migrate_postgres(remove_duplicates)
+
+    _record_schema_version()
+
+
+def schema_version() -> int:
+    """Schema version recorded by the last migration, 0 if never migrated."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+    except Exception:
+        return 0
+
+
+def _record_schema_version():
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
+
+
+@contextmanager
+def _migration_lock():
+    """Hold a PostgreSQL advisory lock so concurrent cold starts migrate once."""
+    if is_sqlite:
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def migrate_if_needed():
+    """
+    Migrate at startup only when the recorded schema version is behind.
+
+    Costs one small query when the schema is current. Duplicate
+    transactions are never deleted here; that needs the explicit
+    --remove-duplicate-transactions run.
+    """
+    if schema_version() >= SCHEMA_VERSION:
+        return
+    with _migration_lock():
+        # Another instance may have migrated while this one waited
+        if schema_version() < SCHEMA_VERSION:
+            migrate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the database schema.")
+    parser.add_argument(
+        "--remove-duplicate-transactions", action="store_true",
+        help=f"delete duplicate transactions that prevent building {DEDUP_INDEX}"
+    )
+    args = parser.parse_args()
+    migrate(remove_duplicates=args.remove_duplicate_transactions)
+    print("Database schema is up to date")
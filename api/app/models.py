@@ -1,6 +1,6 @@
 """SQLAlchemy database models."""
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, Index, Enum as SQLEnum
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 import enum
 
@@ -31,6 +31,12 @@ class Account(Base):
     owner = Column(String(100), nullable=False)  # Who owns this account
     account_type = Column(SQLEnum(AccountType), default=AccountType.PERSONAL)
     default_classification = Column(SQLEnum(TransactionClassification), default=TransactionClassification.PERSONAL)
+    
+    # Latest imported transaction, kept up to date by confirm_upload so the
+    # upload preview doesn't have to sort the account's transactions
+    last_transaction_date = Column(Date, nullable=True)
+    last_balance = Column(Float, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -107,6 +113,13 @@ class Transaction(Base):
     # Unique constraint to prevent duplicates
     # Using transaction_date + amount + details + account_id as composite key
     
+    __table_args__ = (
+        # Matches the list ordering; serves keyset pagination on (date, id)
+        Index("ix_tx_date_id", transaction_date.desc(), id.desc()),
+        # Covers the import duplicate check (account + date range scan)
+        Index("ix_tx_acc_date_amt_details", account_id, transaction_date, amount, details),
+    )
+    
     def __repr__(self):
         return f"<Transaction {self.transaction_date} {self.details} {self.amount}>"
 
@@ -144,10 +157,41 @@ class MerchantRule(Base):
     # Relationships
     category = relationship("Category")
     
+    @validates("merchant_pattern", "match_type")
+    def validate_pattern(self, key, value):
+        """Reject invalid or unsafe regex patterns on every create/update."""
+        from app.services.categorizer import validate_rule_pattern
+        if key == "match_type":
+            validate_rule_pattern(value, self.merchant_pattern)
+        else:
+            validate_rule_pattern(self.match_type, value)
+        return value
+    
     def __repr__(self):
         return f"<MerchantRule {self.merchant_pattern} -> {self.classification.value}>"
 
 
+class LLMCacheEntry(Base):
+    """LLM categorization answers by merchant signature, kept across restarts."""
+    __tablename__ = "llm_cache"
+
+    # Merchant signature: "<debit|credit>|<personal|business>|<normalized merchant>"
+    cache_key = Column(String(300), primary_key=True)
+    
+    # Cached answer
+    classification = Column(String(20), nullable=False)  # personal, business
+    category_id = Column(Integer, nullable=True)  # Checked against current categories on read
+    category_name = Column(String(100))
+    confidence = Column(Float)
+    explanation = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<LLMCacheEntry {self.cache_key} -> {self.category_name}>"
+
+
 class ImportLog(Base):
     """Track file imports for duplicate detection and continuity checks."""
     __tablename__ = "import_logs"
@@ -155,6 +199,7 @@ class ImportLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(String(50), unique=True, nullable=False)
     filename = Column(String(255), nullable=False)
+    file_hash = Column(String(64), index=True)  # SHA-256 of the uploaded file
     account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
     
     # Date range of imported transactions
@@ -171,7 +216,7 @@ class ImportLog(Base):
     duplicate_transactions = Column(Integer, default=0)
     
     # Status
-    status = Column(String(20), default="completed")  # pending, completed, failed
+    status = Column(String(20), default="completed")  # pending, categorizing, completed, failed
     error_message = Column(Text)
     
     imported_at = Column(DateTime, default=datetime.utcnow)
@@ -109,7 +109,8 @@ def categorize_transactions_bulk(
             detail=f"Transactions not found: {missing}"
         )
     
-    categorizer = TransactionCategorizer(db)
+    # Rules-only requests never reach the LLM, so skip setting up a client
+    categorizer = TransactionCategorizer(db, use_llm=not request.apply_rules_only)
     results = categorizer.categorize_batch(
         transactions, 
         apply_rules_only=request.apply_rules_only
@@ -209,6 +210,7 @@ def apply_categorization_bulk(
 ):
     """Apply categorizations to multiple transactions."""
     results = []
+    feedback = []
     
     for req in requests:
         transaction = db.query(Transaction).filter(
@@ -236,19 +238,18 @@ def apply_categorization_bulk(
         transaction.is_reviewed = True
         
         if req.learn:
-            categorizer = TransactionCategorizer(db, use_llm=False)
-            categorizer.learn_from_feedback(
-                transaction,
-                classification,
-                req.category_id,
-                user_confirmed=True
-            )
+            feedback.append((transaction, classification, req.category_id))
         
         results.append({
             "transaction_id": req.transaction_id,
             "success": True
         })
     
+    # Learn from all items together; commits the updates above as well
+    if feedback:
+        categorizer = TransactionCategorizer(db, use_llm=False)
+        categorizer.learn_from_feedback_bulk(feedback, user_confirmed=True)
+    
     db.commit()
     
     return {
@@ -271,7 +272,6 @@ def get_categorization_suggestions(
     By default uses fast rule-based matching. Set use_llm=true for AI suggestions.
     """
     from sqlalchemy.orm import joinedload
-    import re
 
     # OPTIMIZED: Single query with eager loading of account relationship
     query = db.query(Transaction).options(
@@ -288,17 +288,20 @@ def get_categorization_suggestions(
     ).limit(limit).all()
 
     if use_llm:
-        # Slow path: use LLM for each transaction
+        # Slow path: rules, then the LLM in batched requests
         categorizer = TransactionCategorizer(db)
-        results = []
-        for trans in transactions:
-            suggestion = categorizer.categorize_transaction(trans)
-            results.append(_build_suggestion_item(trans, suggestion))
+        results = [
+            _build_suggestion_item(trans, suggestion)
+            for trans, suggestion in zip(transactions, categorizer.categorize_batch(transactions))
+        ]
         return {"total": len(results), "items": results}
 
     # FAST PATH: Batch process all transactions with pre-loaded data
-    # Pre-load all rules ONCE
-    rules = db.query(MerchantRule).order_by(MerchantRule.confidence.desc()).all()
+    # The shared rules snapshot, indexed by lowercased pattern, so each
+    # transaction is only checked against rules whose pattern matches
+    categorizer = TransactionCategorizer(db, use_llm=False)
+    categorizer.preload_rules()
+    categorizer.prefetch_accounts(transactions)
 
     # Pre-load categories for name lookup
     categories = {c.id: c.name for c in db.query(Category).all()}
@@ -311,7 +314,7 @@ def get_categorization_suggestions(
 
     results = []
     for trans in transactions:
-        suggestion = _fast_categorize(trans, rules, categories, account_types)
+        suggestion = _fast_categorize(trans, categorizer, categories, account_types)
         results.append(_build_suggestion_item(trans, suggestion))
 
     return {
@@ -344,55 +347,22 @@ def _build_suggestion_item(trans: Transaction, suggestion: dict) -> dict:
 
 def _fast_categorize(
     trans: Transaction,
-    rules: list,
+    categorizer: TransactionCategorizer,
     categories: dict,
     account_types: dict
 ) -> dict:
-    """Fast categorization without database queries."""
-    import re
+    """
+    Fast categorization without database queries.
+
+    categorizer must have its rules preloaded (see preload_rules).
+    """
     from app.models import AccountType
 
     is_business = account_types.get(trans.account_id) == AccountType.BUSINESS
-    merchant = (trans.details or "").lower()
 
     # Try to match a rule
-    for rule in rules:
-        pattern = rule.merchant_pattern.lower()
-
-        # Pattern matching
-        if rule.match_type == "exact" and merchant != pattern:
-            continue
-        elif rule.match_type == "contains" and pattern not in merchant:
-            continue
-        elif rule.match_type == "startswith" and not merchant.startswith(pattern):
-            continue
-        elif rule.match_type == "regex":
-            if not re.search(pattern, merchant, re.IGNORECASE):
-                continue
-        elif rule.match_type not in ("exact", "contains", "startswith", "regex") and pattern not in merchant:
-            continue
-
-        # Account type check
-        if rule.account_type and account_types.get(trans.account_id) != rule.account_type:
-            continue
-
-        # Amount checks
-        if rule.min_amount is not None and abs(trans.amount) < rule.min_amount:
-            continue
-        if rule.max_amount is not None and abs(trans.amount) > rule.max_amount:
-            continue
-
-        # Day of week check
-        if rule.day_of_week:
-            trans_day = trans.transaction_date.strftime("%A").lower()
-            if rule.day_of_week == "weekend" and trans_day not in ["saturday", "sunday"]:
-                continue
-            elif rule.day_of_week == "weekday" and trans_day in ["saturday", "sunday"]:
-                continue
-            elif rule.day_of_week not in ["weekend", "weekday"] and trans_day != rule.day_of_week.lower():
-                continue
-
-        # Rule matched!
+    rule = categorizer.find_matching_rule(trans)
+    if rule:
         return {
             "classification": rule.classification.value,
             "category_id": rule.category_id,
@@ -564,18 +534,23 @@ def auto_categorize_all(
         "suggestions": []
     }
     
-    for trans in transactions:
-        suggestion = categorizer.categorize_transaction(trans)
-        
+    # One account query and batched LLM requests for the whole set
+    suggestions = categorizer.categorize_batch(transactions)
+    
+    updates = []
+    for trans, suggestion in zip(transactions, suggestions):
         # Categorize by confidence
         if suggestion["confidence"] >= 0.8:
             results["high_confidence"] += 1
             
             # Auto-apply high confidence if requested
             if apply:
-                trans.classification = TransactionClassification(suggestion["classification"])
-                trans.category_id = suggestion.get("category_id")
-                trans.is_reviewed = True
+                updates.append({
+                    "id": trans.id,
+                    "classification": TransactionClassification(suggestion["classification"]),
+                    "category_id": suggestion.get("category_id"),
+                    "is_reviewed": True
+                })
                 results["applied"] += 1
                 
         elif suggestion["confidence"] >= 0.5:
@@ -590,7 +565,9 @@ def auto_categorize_all(
             **suggestion
         })
     
-    if apply:
+    # One executemany UPDATE for every applied suggestion
+    if updates:
+        db.bulk_update_mappings(Transaction, updates)
         db.commit()
     
     return results
@@ -3,20 +3,31 @@ from datetime import date, datetime, timedelta
 from typing import Optional, List
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, and_, extract, String
+from sqlalchemy import func, case, and_, extract, String, Float
 
-from app.database import get_db
+from app.database import get_read_db
 from app.models import Transaction, Category, Account
+from app.routers.transactions import get_transaction_aggregates
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+# Rows fetched per round trip when streaming report results. yield_per()
+# turns on stream_results, i.e. a server-side cursor on PostgreSQL, so
+# rows are formatted as they arrive instead of after a full .all().
+REPORT_BATCH_SIZE = 500
+
+
+def _sum_float(expr):
+    """SUM() that is never NULL and comes back from the driver as a plain float."""
+    return func.coalesce(func.sum(expr), 0.0, type_=Float)
+
 
 @router.get("/spending-by-category")
 def get_spending_by_category(
     date_from: Optional[date] = Query(None, description="Start date"),
     date_to: Optional[date] = Query(None, description="End date"),
     account_id: Optional[int] = Query(None, description="Filter by account"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get spending totals grouped by category for pie/donut charts.
@@ -29,7 +40,7 @@ def get_spending_by_category(
         Category.icon,
         Category.color,
         func.count(Transaction.id).label("transaction_count"),
-        func.sum(func.abs(Transaction.amount)).label("total_amount")
+        _sum_float(func.abs(Transaction.amount)).label("total_amount")
     ).join(
         Transaction, Transaction.category_id == Category.id
     ).filter(
@@ -49,12 +60,12 @@ def get_spending_by_category(
         Category.id, Category.name, Category.icon, Category.color
     ).order_by(
         func.sum(func.abs(Transaction.amount)).desc()
-    ).all()
+    ).yield_per(REPORT_BATCH_SIZE)
 
     # Also get uncategorized spending
     uncategorized_query = db.query(
         func.count(Transaction.id).label("transaction_count"),
-        func.sum(func.abs(Transaction.amount)).label("total_amount")
+        _sum_float(func.abs(Transaction.amount)).label("total_amount")
     ).filter(
         Transaction.amount < 0,
         Transaction.category_id.is_(None)
@@ -77,7 +88,7 @@ def get_spending_by_category(
             "icon": r.icon,
             "color": r.color or "#64748b",  # Default slate color
             "transaction_count": r.transaction_count,
-            "total_amount": float(r.total_amount or 0)
+            "total_amount": r.total_amount
         }
         for r in results
     ]
@@ -90,7 +101,7 @@ def get_spending_by_category(
             "icon": "help-circle",
             "color": "#94a3b8",
             "transaction_count": uncategorized.transaction_count,
-            "total_amount": float(uncategorized.total_amount)
+            "total_amount": uncategorized.total_amount
         })
 
     return data
@@ -102,7 +113,7 @@ def get_income_vs_expenses(
     date_to: Optional[date] = Query(None, description="End date"),
     account_id: Optional[int] = Query(None, description="Filter by account"),
     granularity: str = Query("monthly", description="Grouping: 'weekly' or 'monthly'"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get income and expenses aggregated by time period for bar charts.
@@ -153,8 +164,8 @@ def get_income_vs_expenses(
 
     query = db.query(
         period_expr.label("period"),
-        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)).label("income"),
-        func.sum(case((Transaction.amount < 0, func.abs(Transaction.amount)), else_=0)).label("expenses")
+        _sum_float(case((Transaction.amount > 0, Transaction.amount), else_=0)).label("income"),
+        _sum_float(case((Transaction.amount < 0, func.abs(Transaction.amount)), else_=0)).label("expenses")
     ).filter(
         Transaction.transaction_date >= date_from,
         Transaction.transaction_date <= date_to
@@ -163,13 +174,13 @@ def get_income_vs_expenses(
     if account_id:
         query = query.filter(Transaction.account_id == account_id)
 
-    results = query.group_by(period_expr).order_by(period_expr).all()
+    results = query.group_by(period_expr).order_by(period_expr).yield_per(REPORT_BATCH_SIZE)
 
     # Format results
     data = []
     for r in results:
-        income = float(r.income or 0)
-        expenses = float(r.expenses or 0)
+        income = r.income
+        expenses = r.expenses
 
         # Create human-readable label
         period = r.period
@@ -207,7 +218,7 @@ def get_spending_trends(
     date_to: Optional[date] = Query(None, description="End date"),
     account_id: Optional[int] = Query(None, description="Filter by account"),
     granularity: str = Query("monthly", description="Grouping: 'weekly' or 'monthly'"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get expense amounts over time for line charts.
@@ -236,7 +247,7 @@ def get_spending_trends(
 
     query = db.query(
         period_expr.label("period"),
-        func.sum(func.abs(Transaction.amount)).label("total_amount"),
+        _sum_float(func.abs(Transaction.amount)).label("total_amount"),
         func.count(Transaction.id).label("transaction_count")
     ).filter(
         Transaction.transaction_date >= date_from,
@@ -247,7 +258,7 @@ def get_spending_trends(
     if account_id:
         query = query.filter(Transaction.account_id == account_id)
 
-    results = query.group_by(period_expr).order_by(period_expr).all()
+    results = query.group_by(period_expr).order_by(period_expr).yield_per(REPORT_BATCH_SIZE)
 
     # Format results
     data = []
@@ -273,7 +284,7 @@ def get_spending_trends(
         data.append({
             "period": period,
             "period_label": period_label,
-            "amount": float(r.total_amount or 0),
+            "amount": r.total_amount,
             "transaction_count": r.transaction_count
         })
 
@@ -285,7 +296,7 @@ def get_report_summary(
     date_from: Optional[date] = Query(None, description="Start date"),
     date_to: Optional[date] = Query(None, description="End date"),
     account_id: Optional[int] = Query(None, description="Filter by account"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get overall summary statistics for the reports page header.
@@ -296,32 +307,17 @@ def get_report_summary(
     if not date_from:
         date_from = date_to - timedelta(days=365)
 
-    # Base query
-    query = db.query(Transaction).filter(
-        Transaction.transaction_date >= date_from,
-        Transaction.transaction_date <= date_to
-    )
-
-    if account_id:
-        query = query.filter(Transaction.account_id == account_id)
-
-    # Calculate aggregates
-    stats = query.with_entities(
-        func.count(Transaction.id).label("total_transactions"),
-        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)).label("total_income"),
-        func.sum(case((Transaction.amount < 0, Transaction.amount), else_=0)).label("total_expenses"),
-        func.avg(case((Transaction.amount < 0, func.abs(Transaction.amount)), else_=None)).label("avg_expense")
-    ).first()
+    stats = get_transaction_aggregates(db, account_id, date_from, date_to, include_counts=False)
 
-    total_income = float(stats.total_income or 0)
-    total_expenses = float(abs(stats.total_expenses or 0))
+    total_income = float(stats["income"] or 0)
+    total_expenses = float(abs(stats["expenses"] or 0))
 
     return {
         "date_from": date_from.isoformat(),
         "date_to": date_to.isoformat(),
-        "total_transactions": stats.total_transactions or 0,
+        "total_transactions": stats["total_count"] or 0,
         "total_income": total_income,
         "total_expenses": total_expenses,
         "net_cashflow": total_income - total_expenses,
-        "avg_expense": float(stats.avg_expense or 0)
+        "avg_expense": float(stats["avg_expense"] or 0)
     }
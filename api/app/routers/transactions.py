@@ -1,20 +1,36 @@
 """Transaction management endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_, or_, case
-from typing import List, Optional
+from sqlalchemy import func, and_, case, literal_column, tuple_
+from typing import List, Optional, Tuple
 from datetime import date
+import base64
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import Transaction, Account, Category, TransactionClassification
 from app.schemas import (
     TransactionResponse, TransactionUpdate, TransactionListResponse,
     CategoryResponse, AccountResponse
 )
 from app.routers.categories import get_business_na_category
+from app.tasks import run_after_response
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+# Value -> enum lookup, avoids Enum construction in per-item loops
+_CLS_BY_VALUE = {e.value: e for e in TransactionClassification}
+
+# Searchable text as a single expression so PostgreSQL can answer
+# ILIKE '%term%' from the ix_tx_search_trgm GIN index (see database.py).
+_EMPTY = literal_column("''")
+_SPACE = literal_column("' '")
+SEARCH_TEXT = (
+    func.coalesce(Transaction.details, _EMPTY) + _SPACE +
+    func.coalesce(Transaction.particulars, _EMPTY) + _SPACE +
+    func.coalesce(Transaction.code, _EMPTY) + _SPACE +
+    func.coalesce(Transaction.reference, _EMPTY)
+)
+
 
 def transaction_to_response(trans: Transaction) -> TransactionResponse:
     """Convert Transaction model to response schema."""
@@ -69,6 +85,21 @@ def transaction_to_response(trans: Transaction) -> TransactionResponse:
     )
 
 
+def encode_cursor(trans: Transaction) -> str:
+    """Encode a transaction's (date, id) sort key as an opaque page cursor."""
+    raw = f"{trans.transaction_date.isoformat()}|{trans.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Decode a page cursor back into its (date, id) sort key."""
+    try:
+        raw_date, raw_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(raw_date), int(raw_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=TransactionListResponse)
 def list_transactions(
     page: int = Query(1, ge=1),
@@ -82,10 +113,15 @@ def list_transactions(
     search: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
+    after: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     List transactions with filtering and pagination.
+
+    Pass `after` (the previous response's `next_cursor`) for keyset
+    pagination, which stays fast at any depth. `page` is still honoured
+    when no cursor is given.
     """
     # Build filters list to apply to both count and data queries
     filters = []
@@ -103,11 +139,9 @@ def list_transactions(
                 pass
 
     if classification:
-        try:
-            class_enum = TransactionClassification(classification.lower())
+        class_enum = _CLS_BY_VALUE.get(classification.lower())
+        if class_enum is not None:
             filters.append(Transaction.classification == class_enum)
-        except ValueError:
-            pass
 
     if is_reviewed is not None:
         filters.append(Transaction.is_reviewed == is_reviewed)
@@ -119,15 +153,7 @@ def list_transactions(
         filters.append(Transaction.transaction_date <= date_to)
 
     if search:
-        search_term = f"%{search}%"
-        filters.append(
-            or_(
-                Transaction.details.ilike(search_term),
-                Transaction.particulars.ilike(search_term),
-                Transaction.code.ilike(search_term),
-                Transaction.reference.ilike(search_term)
-            )
-        )
+        filters.append(SEARCH_TEXT.ilike(f"%{search}%"))
 
     if min_amount is not None:
         filters.append(Transaction.amount >= min_amount)
@@ -139,14 +165,23 @@ def list_transactions(
     total = db.query(func.count(Transaction.id)).filter(*filters).scalar()
 
     # Get paginated data with eager loading
-    offset = (page - 1) * page_size
-    transactions = db.query(Transaction).options(
+    query = db.query(Transaction).options(
         joinedload(Transaction.account),
         joinedload(Transaction.category)
     ).filter(*filters).order_by(
         Transaction.transaction_date.desc(),
         Transaction.id.desc()
-    ).offset(offset).limit(page_size).all()
+    )
+
+    if after:
+        cursor_date, cursor_id = decode_cursor(after)
+        query = query.filter(
+            tuple_(Transaction.transaction_date, Transaction.id) < tuple_(cursor_date, cursor_id)
+        )
+    else:
+        query = query.offset((page - 1) * page_size)
+
+    transactions = query.limit(page_size).all()
 
     # Calculate total pages
     total_pages = (total + page_size - 1) // page_size
@@ -156,7 +191,8 @@ def list_transactions(
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=encode_cursor(transactions[-1]) if len(transactions) == page_size else None
     )
 
 
@@ -174,14 +210,34 @@ def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
     return transaction_to_response(trans)
 
 
+def _propagate_task(transaction_id: int):
+    """Propagate a user categorization to similar transactions after the response is sent."""
+    from app.services.ml_categorizer import propagate_categorization
+
+    # The request's session is closed by now, so use a dedicated one
+    db = SessionLocal()
+    try:
+        trans = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+        if trans:
+            propagate_categorization(db, trans, apply_to_similar=True)
+    finally:
+        db.close()
+
+
 @router.put("/{transaction_id}", response_model=TransactionResponse)
 def update_transaction(
     transaction_id: int,
     update: TransactionUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Update transaction classification, category, or notes."""
-    trans = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    # Eager-load relationships so the refresh after commit reloads them in
+    # the same SELECT instead of needing a separate reload query
+    trans = db.query(Transaction).options(
+        joinedload(Transaction.account),
+        joinedload(Transaction.category)
+    ).filter(Transaction.id == transaction_id).first()
     
     if not trans:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -197,7 +253,7 @@ def update_transaction(
             trans.category_id = None
     
     if update.classification is not None:
-        new_classification = TransactionClassification(update.classification.value)
+        new_classification = _CLS_BY_VALUE[update.classification.value]
         trans.classification = new_classification
         
         # Auto-assign N/A category for business transactions without a category
@@ -219,16 +275,10 @@ def update_transaction(
     db.commit()
     db.refresh(trans)
     
-    # Propagate to similar transactions
+    # Propagate to similar transactions once the response has been sent
+    # (see run_after_response)
     if update.category_id is not None or update.classification is not None:
-        from app.services.ml_categorizer import propagate_categorization
-        propagate_categorization(db, trans, apply_to_similar=True)
-    
-    # Reload with relationships
-    trans = db.query(Transaction).options(
-        joinedload(Transaction.account),
-        joinedload(Transaction.category)
-    ).filter(Transaction.id == transaction_id).first()
+        run_after_response(background_tasks, _propagate_task, transaction_id)
     
     return transaction_to_response(trans)
 
@@ -252,12 +302,16 @@ def bulk_update_transactions(
             detail=f"Transactions not found: {missing}"
         )
     
+    new_classification = None
+    if update.classification is not None:
+        new_classification = _CLS_BY_VALUE[update.classification.value]
+    
     for trans in transactions:
         if update.category_id is not None:
             trans.category_id = update.category_id if update.category_id != 0 else None
         
-        if update.classification is not None:
-            trans.classification = TransactionClassification(update.classification.value)
+        if new_classification is not None:
+            trans.classification = new_classification
         
         if update.is_reviewed is not None:
             trans.is_reviewed = update.is_reviewed
@@ -279,7 +333,7 @@ class BulkUpdateItem(BaseModel):
 
 @router.post("/bulk-update-items")
 def bulk_update_individual_transactions(
-    items: List[BulkUpdateItem],
+    items: List[BulkUpdateItem] = Body(...),
     db: Session = Depends(get_db)
 ):
     """Bulk update transactions with individual values per transaction."""
@@ -304,7 +358,7 @@ def bulk_update_individual_transactions(
             continue
         
         if item.classification is not None:
-            new_classification = TransactionClassification(item.classification.lower())
+            new_classification = _CLS_BY_VALUE[item.classification.lower()]
             trans.classification = new_classification
             
             # Auto-assign N/A category for business transactions without a category
@@ -330,15 +384,21 @@ def bulk_update_individual_transactions(
     return {"message": f"Updated {updated} transactions", "count": updated}
 
 
-@router.get("/stats/summary")
-def get_transaction_stats(
+def get_transaction_aggregates(
+    db: Session,
     account_id: Optional[int] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
-    db: Session = Depends(get_db)
+    include_counts: bool = True
 ):
-    """Get transaction statistics - optimized single query."""
-    # Build base filter conditions
+    """
+    Aggregate totals and counts over transactions in one scan.
+
+    Shared by /transactions/stats/summary and /reports/summary. With
+    include_counts=False only the totals (total_count, income, expenses,
+    avg_expense) are computed, skipping the classification and review
+    counts.
+    """
     filters = []
     if account_id:
         filters.append(Transaction.account_id == account_id)
@@ -348,34 +408,49 @@ def get_transaction_stats(
         filters.append(Transaction.transaction_date <= date_to)
 
     # Single query with all aggregations using CASE statements
-    stats = db.query(
+    columns = [
         func.count(Transaction.id).label('total_count'),
-        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)).label('income'),
-        func.sum(case((Transaction.amount < 0, Transaction.amount), else_=0)).label('expenses'),
-        func.sum(case((Transaction.classification == TransactionClassification.UNCLASSIFIED, 1), else_=0)).label('unclassified'),
-        func.sum(case((Transaction.classification == TransactionClassification.PERSONAL, 1), else_=0)).label('personal'),
-        func.sum(case((Transaction.classification == TransactionClassification.BUSINESS, 1), else_=0)).label('business'),
-        func.sum(case((Transaction.is_reviewed == False, 1), else_=0)).label('unreviewed'),
-        func.sum(case(
-            (and_(
-                Transaction.classification == TransactionClassification.PERSONAL,
-                Transaction.category_id == None
-            ), 1),
-            else_=0
-        )).label('uncategorized')
-    ).filter(*filters).first()
+        func.coalesce(func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)), 0).label('income'),
+        func.coalesce(func.sum(case((Transaction.amount < 0, Transaction.amount), else_=0)), 0).label('expenses'),
+        func.coalesce(func.avg(case((Transaction.amount < 0, func.abs(Transaction.amount)), else_=None)), 0).label('avg_expense'),
+    ]
+    if include_counts:
+        columns += [
+            func.sum(case((Transaction.classification == TransactionClassification.UNCLASSIFIED, 1), else_=0)).label('unclassified'),
+            func.sum(case((Transaction.classification == TransactionClassification.PERSONAL, 1), else_=0)).label('personal'),
+            func.sum(case((Transaction.classification == TransactionClassification.BUSINESS, 1), else_=0)).label('business'),
+            func.sum(case((Transaction.is_reviewed == False, 1), else_=0)).label('unreviewed'),
+            func.sum(case(
+                (and_(
+                    Transaction.classification == TransactionClassification.PERSONAL,
+                    Transaction.category_id == None
+                ), 1),
+                else_=0
+            )).label('uncategorized'),
+        ]
+    return db.query(*columns).filter(*filters).one()._mapping
+
+
+@router.get("/stats/summary")
+def get_transaction_stats(
+    account_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Get transaction statistics - optimized single query."""
+    stats = get_transaction_aggregates(db, account_id, date_from, date_to)
 
     return {
-        "total_transactions": stats.total_count or 0,
-        "total_income": float(stats.income or 0),
-        "total_expenses": float(stats.expenses or 0),
-        "net_cashflow": float((stats.income or 0) + (stats.expenses or 0)),
+        "total_transactions": stats["total_count"] or 0,
+        "total_income": float(stats["income"] or 0),
+        "total_expenses": float(stats["expenses"] or 0),
+        "net_cashflow": float((stats["income"] or 0) + (stats["expenses"] or 0)),
         "classification": {
-            "unclassified": stats.unclassified or 0,
-            "personal": stats.personal or 0,
-            "business": stats.business or 0
+            "unclassified": stats["unclassified"] or 0,
+            "personal": stats["personal"] or 0,
+            "business": stats["business"] or 0
         },
-        "unreviewed_count": stats.unreviewed or 0,
-        "uncategorized_count": stats.uncategorized or 0
+        "unreviewed_count": stats["unreviewed"] or 0,
+        "uncategorized_count": stats["uncategorized"] or 0
     }
-
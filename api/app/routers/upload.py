@@ -1,18 +1,26 @@
 """File upload and import endpoints."""
 import os
 import uuid
-import shutil
+import asyncio
+import hashlib
 import logging
+import json
+import mmap
 import time
-from datetime import datetime
+from collections import Counter
+from datetime import date, datetime, timedelta
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body, Query
+import aiofiles
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Body, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, update, bindparam, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
+from app.migrate import DEDUP_INDEX, index_is_valid
 
 logger = logging.getLogger(__name__)
 
@@ -21,48 +29,252 @@ logger = logging.getLogger(__name__)
 # ============================================
 DEBUG_UPLOAD = os.getenv("DEBUG_UPLOAD", "true").lower() == "true"
 
-def debug_log(message: str, context: str = "UPLOAD"):
-    """Print debug message if DEBUG_UPLOAD is enabled."""
+def debug_log(message: str, *args, context: str = "UPLOAD"):
+    """
+    Print debug message if DEBUG_UPLOAD is enabled.
+
+    Like logging, args are %-formatted into message only when enabled, so
+    disabled calls skip the formatting; wrap calls needing I/O in
+    DEBUG_UPLOAD.
+    """
     if DEBUG_UPLOAD:
+        if args:
+            message = message % args
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
         print(f"[{timestamp}][{context}] {message}")
-from app.models import Account, Transaction, ImportLog, TransactionClassification, AccountType
+from app.models import Account, Transaction, ImportLog, MerchantRule, TransactionClassification, AccountType
 from app.schemas import (
     UploadPreview, UploadResult, FileUploadInfo, 
     AccountResponse, AccountCreate
 )
 from app.services.excel_parser import ExcelParser, parse_excel_file
 from app.services.categorizer import TransactionCategorizer
+from app.tasks import run_after_response
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 # Temporary upload directory - use /tmp for serverless compatibility
 import tempfile
 UPLOAD_DIR = Path(tempfile.gettempdir()) / "finance_uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Created once per process at import. Not deferred to the app lifespan:
+# the Vercel entry point (index.py) doesn't rely on lifespan events.
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# An import still "categorizing" after this long lost its task (see
+# _recover_stale_imports); rules-only categorization takes seconds
+STALE_CATEGORIZING_AFTER = timedelta(minutes=10)
+# Stale imports re-run per status/history request, to bound its latency
+STALE_IMPORTS_PER_REQUEST = 3
+
+# Duplicate-detection key of a parsed transaction (ExcelParser always sets
+# all four keys), matching the (date, amount, details, balance) rows queried
+# back. The running balance tells a genuine repeat purchase (same day,
+# amount and merchant) from a re-exported copy of the same row.
+transaction_signature = itemgetter("transaction_date", "amount", "details", "balance")
+transaction_date_key = itemgetter("transaction_date")
+
+
+# Parsed-row fields holding dates, stored as ISO strings in the JSON cache
+PARSED_DATE_FIELDS = ("transaction_date", "processed_date")
+
+
+def _check_file_id(file_id: str) -> str:
+    """
+    Canonical form of an upload's file_id, which must be a UUID.
+
+    file_id comes from the client and becomes part of a file path, so
+    anything else (such as "../x") is rejected before a path is built.
+    """
+    try:
+        return str(uuid.UUID(file_id))
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid file ID")
 
 
 def get_temp_file_path(file_id: str) -> Path:
     """Get path to temporary uploaded file."""
-    return UPLOAD_DIR / f"{file_id}.xlsx"
+    return UPLOAD_DIR / f"{_check_file_id(file_id)}.xlsx"
+
+
+def get_parsed_cache_path(file_id: str) -> Path:
+    """Get path to the transactions parsed during preview."""
+    return UPLOAD_DIR / f"{_check_file_id(file_id)}.json"
+
+
+def _json_default(value):
+    """Serialize the dates in parsed rows as ISO strings."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _save_parsed_rows(path: Path, transactions: list, file_hash: str):
+    """Write the rows parsed during preview for confirm to reuse."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"transactions": transactions, "file_hash": file_hash}, f, default=_json_default)
+
+
+def _load_parsed_rows(path: Path):
+    """Read rows written by _save_parsed_rows. Returns (transactions, file_hash)."""
+    with open(path, encoding="utf-8") as f:
+        cached = json.load(f)
+    transactions = cached["transactions"]
+    for trans in transactions:
+        for field in PARSED_DATE_FIELDS:
+            if trans.get(field):
+                trans[field] = date.fromisoformat(trans[field])
+    return transactions, cached["file_hash"]
+
+
+# Whether ux_tx_import_dedup exists and is valid, checked once per process
+_dedup_index_ready: Optional[bool] = None
+
+
+def _has_dedup_index(db: Session) -> bool:
+    """
+    Whether the database enforces the import dedup key (PostgreSQL only).
+
+    The index is built by app.migrate, which skips it while the table
+    still holds duplicate rows; ON CONFLICT DO NOTHING would then skip
+    nothing. A failed concurrent build leaves an INVALID index, which
+    can't serve as the conflict arbiter either. The schema only changes
+    at deploy, so one check per process is enough.
+    """
+    global _dedup_index_ready
+    if _dedup_index_ready is None:
+        _dedup_index_ready = (
+            db.bind.dialect.name == "postgresql" and bool(index_is_valid(DEDUP_INDEX))
+        )
+    return _dedup_index_ready
+
+
+def _hash_file(path: Path) -> str:
+    """SHA-256 hex digest of a file, hashed straight from a read-only mmap."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()  # mmap can't map empty files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+
+def _latest_transaction(db: Session, account: Account):
+    """
+    (date, balance) of the account's latest transaction, or (None, None).
+
+    Read from the account's last_transaction_date / last_balance; only
+    accounts last imported before those columns existed need a query.
+    """
+    if account.last_transaction_date is not None:
+        return account.last_transaction_date, account.last_balance
+
+    latest = db.query(
+        Transaction.transaction_date,
+        Transaction.balance
+    ).filter(
+        Transaction.account_id == account.id
+    ).order_by(Transaction.transaction_date.desc()).first()
+    return (latest.transaction_date, latest.balance) if latest else (None, None)
+
+
+def _find_account(db: Session, *criteria):
+    """
+    First account matching criteria and its transaction count, fetched
+    together in a single query. Returns (None, 0) if there is no match.
+    """
+    trans_count = select(func.count(Transaction.id)).where(
+        Transaction.account_id == Account.id
+    ).scalar_subquery()
+    found = db.query(Account, trans_count).filter(*criteria).first()
+    return (found[0], found[1] or 0) if found else (None, 0)
+
+
+def _existing_account_info(db: Session, account: Account, trans_count: int):
+    """
+    Build the AccountResponse for an existing account together with its
+    latest transaction date and balance.
+    """
+    last_date, last_balance = _latest_transaction(db, account)
+
+    account_response = AccountResponse(
+        id=account.id,
+        account_number=account.account_number,
+        name=account.name,
+        owner=account.owner,
+        account_type=account.account_type.value,
+        created_at=account.created_at,
+        updated_at=account.updated_at,
+        transaction_count=trans_count
+    )
+    return account_response, last_date, last_balance
+
+
+def _parse_upload(file_path: str, filename: str, parse_rows: bool = True):
+    """
+    Load, validate and parse an uploaded statement.
+
+    Blocking (openpyxl); run via asyncio.to_thread from async endpoints.
+    Returns (file_info, transactions); transactions is None when
+    parse_rows is False (headers and filename only).
+    """
+    parse_start = time.time()
+    debug_log("Creating ExcelParser...", context="PREVIEW")
+    parser = ExcelParser(file_path)
+    try:
+        debug_log("Loading Excel file...", context="PREVIEW")
+        parser.load()
+        debug_log("Excel loaded in %.2fs", time.time()-parse_start, context="PREVIEW")
+
+        debug_log("Validating headers...", context="PREVIEW")
+        valid, missing = parser.validate_headers()
+        if not valid:
+            debug_log("ERROR: Invalid headers, missing: %s", missing, context="PREVIEW")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file format. Missing columns: {missing}"
+            )
+        debug_log("Headers valid ✓", context="PREVIEW")
+
+        # Get file info and transactions
+        debug_log("Parsing filename: %s", filename, context="PREVIEW")
+        file_info = parser.parse_filename_string(filename)
+        file_info["raw_filename"] = filename
+        debug_log("Account number from filename: %s", file_info.get('account_number'), context="PREVIEW")
+
+        if not parse_rows:
+            return file_info, None
+
+        trans_start = time.time()
+        debug_log("Parsing transactions...", context="PREVIEW")
+        transactions = parser.parse_transactions()
+        debug_log("Parsed %s transactions in %.2fs", len(transactions), time.time()-trans_start, context="PREVIEW")
+        return file_info, transactions
+    finally:
+        parser.close()
 
 
 @router.post("/preview", response_model=UploadPreview)
 async def upload_preview(
     file: UploadFile = File(...),
+    quick: bool = Query(False, description="Only validate headers and read the filename"),
     db: Session = Depends(get_db)
 ):
     """
     Upload a file and get a preview before confirming import.
 
     Returns file info, detected account, sample transactions,
-    and duplicate/continuity check results.
+    and duplicate/continuity check results. With quick=true the rows
+    are not parsed: only header validation, filename metadata and the
+    matching account are returned.
     """
     start_time = time.time()
-    debug_log(f"=== PREVIEW START === File: {file.filename}", "PREVIEW")
+    debug_log("=== PREVIEW START === File: %s", file.filename, context="PREVIEW")
 
     if not file.filename.endswith(('.xlsx', '.xls')):
-        debug_log(f"ERROR: Invalid file type: {file.filename}", "PREVIEW")
+        debug_log("ERROR: Invalid file type: %s", file.filename, context="PREVIEW")
         raise HTTPException(
             status_code=400,
             detail="Only Excel files (.xlsx, .xls) are supported"
@@ -71,59 +283,103 @@ async def upload_preview(
     # Generate unique file ID and save temporarily
     file_id = str(uuid.uuid4())
     temp_path = get_temp_file_path(file_id)
-    debug_log(f"Generated file_id: {file_id}", "PREVIEW")
-    debug_log(f"Temp path: {temp_path}", "PREVIEW")
+    debug_log("Generated file_id: %s", file_id, context="PREVIEW")
+    debug_log("Temp path: %s", temp_path, context="PREVIEW")
 
     try:
-        # Save uploaded file
+        # Stream the upload to disk without blocking the event loop
         save_start = time.time()
-        debug_log(f"Saving uploaded file...", "PREVIEW")
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        file_size = temp_path.stat().st_size
-        debug_log(f"File saved: {file_size:,} bytes in {time.time()-save_start:.2f}s", "PREVIEW")
-
-        # Parse the file
-        parse_start = time.time()
-        debug_log(f"Creating ExcelParser...", "PREVIEW")
-        parser = ExcelParser(str(temp_path))
-        debug_log(f"Loading Excel file...", "PREVIEW")
-        parser.load()
-        debug_log(f"Excel loaded in {time.time()-parse_start:.2f}s", "PREVIEW")
-
-        debug_log(f"Validating headers...", "PREVIEW")
-        valid, missing = parser.validate_headers()
-        if not valid:
-            debug_log(f"ERROR: Invalid headers, missing: {missing}", "PREVIEW")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file format. Missing columns: {missing}"
+        debug_log("Saving uploaded file...", context="PREVIEW")
+        hasher = hashlib.sha256()
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
+                hasher.update(chunk)
+        file_hash = hasher.hexdigest()
+        if DEBUG_UPLOAD:
+            file_size = temp_path.stat().st_size
+            debug_log(f"File saved: {file_size:,} bytes in {time.time()-save_start:.2f}s", context="PREVIEW")
+
+        # Identical bytes were fully imported before: answer from the import
+        # log without parsing the workbook. The counts are that import's,
+        # flagged as such via previously_imported_at. Quick previews don't
+        # parse rows anyway and keep their own response. The account comes
+        # from the filename, so the same bytes under another account's
+        # filename are previewed afresh.
+        previous = None if quick else db.query(ImportLog).filter(
+            ImportLog.file_hash == file_hash,
+            ImportLog.status == "completed"
+        ).order_by(ImportLog.imported_at.desc()).first()
+        previous_account, trans_count = (
+            _find_account(db, Account.id == previous.account_id) if previous else (None, 0)
+        )
+        filename_account_number = ExcelParser(temp_path).parse_filename_string(file.filename)["account_number"]
+        if previous_account and previous_account.account_number == filename_account_number:
+            debug_log("File already imported in batch %s, skipping parse", previous.batch_id, context="PREVIEW")
+            existing_account, last_date, last_balance = _existing_account_info(db, previous_account, trans_count)
+            return UploadPreview(
+                file_info=FileUploadInfo(
+                    filename=f"{file_id}|{file.filename}",  # Embed file_id
+                    account_number=previous_account.account_number,
+                    date_from=previous.date_from,
+                    date_to=previous.date_to,
+                    total_rows=previous.total_transactions
+                ),
+                existing_account=existing_account,
+                duplicate_count=previous.total_transactions,
+                new_count=0,
+                continuity_message=(
+                    f"This file was already imported on {previous.imported_at:%Y-%m-%d}. "
+                    f"Counts are from that import, not a fresh duplicate check."
+                ),
+                last_imported_date=last_date,
+                last_imported_balance=last_balance,
+                first_new_date=previous.date_from,
+                first_new_balance=previous.opening_balance,
+                previously_imported_at=previous.imported_at
             )
-        debug_log(f"Headers valid ✓", "PREVIEW")
 
-        # Get file info and transactions
-        debug_log(f"Parsing filename: {file.filename}", "PREVIEW")
-        file_info = parser.parse_filename_string(file.filename)
-        file_info["raw_filename"] = file.filename
-        debug_log(f"Account number from filename: {file_info.get('account_number')}", "PREVIEW")
+        # Parse the file in a worker thread
+        file_info, transactions = await asyncio.to_thread(
+            _parse_upload, str(temp_path), file.filename, not quick
+        )
 
-        trans_start = time.time()
-        debug_log(f"Parsing transactions...", "PREVIEW")
-        transactions = parser.parse_transactions()
-        debug_log(f"Parsed {len(transactions)} transactions in {time.time()-trans_start:.2f}s", "PREVIEW")
-        parser.close()
+        if quick:
+            existing_account = None
+            if file_info.get("account_number"):
+                existing, trans_count = _find_account(
+                    db, Account.account_number == file_info["account_number"]
+                )
+                if existing:
+                    existing_account, _, _ = _existing_account_info(db, existing, trans_count)
+            debug_log("=== QUICK PREVIEW COMPLETE === in %.2fs", time.time()-start_time, context="PREVIEW")
+            return UploadPreview(
+                file_info=FileUploadInfo(
+                    filename=f"{file_id}|{file.filename}",  # Embed file_id
+                    account_number=file_info.get("account_number"),
+                    date_from=file_info.get("date_from"),
+                    date_to=file_info.get("date_to")
+                ),
+                existing_account=existing_account,
+                new_count=0
+            )
         
         if not transactions:
-            debug_log(f"ERROR: No transactions found in file", "PREVIEW")
+            debug_log("ERROR: No transactions found in file", context="PREVIEW")
             raise HTTPException(
                 status_code=400,
                 detail="No valid transactions found in file"
             )
 
         # Sort by date
-        debug_log(f"Sorting transactions by date...", "PREVIEW")
-        transactions.sort(key=lambda x: x["transaction_date"])
-        debug_log(f"Date range: {transactions[0]['transaction_date']} to {transactions[-1]['transaction_date']}", "PREVIEW")
+        debug_log("Sorting transactions by date...", context="PREVIEW")
+        transactions.sort(key=transaction_date_key)
+        debug_log("Date range: %s to %s", transactions[0]['transaction_date'], transactions[-1]['transaction_date'], context="PREVIEW")
+
+        # Keep the parsed rows so confirm doesn't have to re-parse the file
+        await asyncio.to_thread(
+            _save_parsed_rows, get_parsed_cache_path(file_id), transactions, file_hash
+        )
         
         # Build file info response
         file_info_response = FileUploadInfo(
@@ -137,59 +393,49 @@ async def upload_preview(
         # Check if account exists
         existing_account = None
         suggested_account = None
+        last_date = last_balance = None
         
         if file_info.get("account_number"):
-            existing = db.query(Account).filter(
-                Account.account_number == file_info["account_number"]
-            ).first()
+            # Account and its transaction count in one round trip
+            existing, trans_count = _find_account(
+                db, Account.account_number == file_info["account_number"]
+            )
             
             if existing:
-                trans_count = db.query(func.count(Transaction.id)).filter(
-                    Transaction.account_id == existing.id
-                ).scalar()
-                
-                existing_account = AccountResponse(
-                    id=existing.id,
-                    account_number=existing.account_number,
-                    name=existing.name,
-                    owner=existing.owner,
-                    account_type=existing.account_type.value,
-                    created_at=existing.created_at,
-                    updated_at=existing.updated_at,
-                    transaction_count=trans_count
-                )
+                existing_account, last_date, last_balance = _existing_account_info(db, existing, trans_count)
         
         # Check for duplicates if account exists
         duplicate_count = 0
         new_count = len(transactions)
 
         if existing_account:
-            debug_log(f"Checking for duplicates against existing account...", "PREVIEW")
+            debug_log("Checking for duplicates against existing account...", context="PREVIEW")
             dup_start = time.time()
 
-            # Build a set of existing transaction signatures for O(1) lookup
+            # Build a set of existing transaction signatures for O(1) lookup,
+            # limited to the file's date range (transactions are sorted above)
+            dmin, dmax = transactions[0]["transaction_date"], transactions[-1]["transaction_date"]
             existing_signatures = set(
                 db.query(
                     Transaction.transaction_date,
                     Transaction.amount,
-                    Transaction.details
+                    Transaction.details,
+                    Transaction.balance
                 ).filter(
-                    Transaction.account_id == existing_account.id
+                    Transaction.account_id == existing_account.id,
+                    Transaction.transaction_date.between(dmin, dmax)
                 ).all()
             )
 
-            # Check each transaction against the set (no DB queries in loop)
-            for trans in transactions:
-                signature = (
-                    trans["transaction_date"],
-                    trans["amount"],
-                    trans.get("details")
-                )
-                if signature in existing_signatures:
-                    duplicate_count += 1
+            # Check each transaction against the set; map() keeps key building
+            # and membership tests in C (no DB queries, no Python-level loop)
+            duplicate_count = sum(map(
+                existing_signatures.__contains__,
+                map(transaction_signature, transactions)
+            ))
 
             new_count = len(transactions) - duplicate_count
-            debug_log(f"Duplicate check complete in {time.time()-dup_start:.2f}s: {duplicate_count} duplicates, {new_count} new", "PREVIEW")
+            debug_log("Duplicate check complete in %.2fs: %s duplicates, %s new", time.time()-dup_start, duplicate_count, new_count, context="PREVIEW")
         
         # Check balance continuity
         continuity_ok = True
@@ -200,14 +446,10 @@ async def upload_preview(
         first_new_balance = transactions[0].get("balance") if transactions else None
         
         if existing_account:
-            # Get the last imported transaction for this account
-            last_trans = db.query(Transaction).filter(
-                Transaction.account_id == existing_account.id
-            ).order_by(Transaction.transaction_date.desc()).first()
-            
-            if last_trans:
-                last_imported_date = last_trans.transaction_date
-                last_imported_balance = last_trans.balance
+            # Last imported transaction for this account, fetched above
+            if last_date:
+                last_imported_date = last_date
+                last_imported_balance = last_balance
                 
                 # Check if there's a gap
                 if first_new_date and last_imported_date:
@@ -239,7 +481,7 @@ async def upload_preview(
         # In production, use Redis or database
         
         total_time = time.time() - start_time
-        debug_log(f"=== PREVIEW COMPLETE === {len(transactions)} transactions, {new_count} new, {duplicate_count} duplicates in {total_time:.2f}s", "PREVIEW")
+        debug_log("=== PREVIEW COMPLETE === %s transactions, %s new, %s duplicates in %.2fs", len(transactions), new_count, duplicate_count, total_time, context="PREVIEW")
 
         return UploadPreview(
             file_info=FileUploadInfo(
@@ -266,16 +508,115 @@ async def upload_preview(
         # Clean up temp file on error
         if temp_path.exists():
             os.remove(temp_path)
+        get_parsed_cache_path(file_id).unlink(missing_ok=True)
         raise
     except Exception as e:
         # Clean up temp file on error
         if temp_path.exists():
             os.remove(temp_path)
+        get_parsed_cache_path(file_id).unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
+def _auto_categorize_batch(db: Session, batch_id: str) -> int:
+    """
+    Apply high-confidence learned rules to a freshly imported batch.
+
+    Returns the number of transactions categorized. Does not commit.
+    """
+    categorizer = TransactionCategorizer(db, use_llm=False)  # Rules only for speed
+    categorizer.preload_rules()  # One rules query for the whole batch
+    # Only the columns rule matching looks at; no ORM objects to track
+    new_transactions = db.query(
+        Transaction.id,
+        Transaction.account_id,
+        Transaction.transaction_date,
+        Transaction.details,
+        Transaction.amount
+    ).filter(
+        Transaction.import_batch_id == batch_id
+    ).all()
+
+    updates = []
+    rule_hits = Counter()
+    for trans in new_transactions:
+        rule = categorizer.find_matching_rule(trans)
+        if rule and rule.confidence >= 0.8:
+            updates.append({
+                "id": trans.id,
+                "classification": rule.classification,
+                "category_id": rule.category_id,
+                "is_reviewed": True
+            })
+            rule_hits[rule.id] += 1
+
+    # One executemany UPDATE for all categorized rows
+    if updates:
+        db.bulk_update_mappings(Transaction, updates)
+
+    # Apply usage counters in one executemany UPDATE
+    if rule_hits:
+        db.connection().execute(
+            update(MerchantRule)
+            .where(MerchantRule.id == bindparam("rule_id"))
+            .values(times_applied=MerchantRule.times_applied + bindparam("hits")),
+            [{"rule_id": rule_id, "hits": hits} for rule_id, hits in rule_hits.items()]
+        )
+
+    return len(updates)
+
+
+def _auto_categorize_task(batch_id: str):
+    """
+    Background task: auto-categorize an imported batch, then mark its
+    import log completed. A failure leaves the rows uncategorized but
+    never affects the import itself.
+    """
+    # The request's session is closed by now, so use a dedicated one
+    db = SessionLocal()
+    try:
+        cat_start = time.time()
+        try:
+            categorized_count = _auto_categorize_batch(db, batch_id)
+            db.commit()
+            debug_log("Auto-categorization complete in %.2fs: %s categorized", time.time()-cat_start, categorized_count, context="CONFIRM")
+        except Exception as e:
+            db.rollback()
+            debug_log("Auto-categorization error (non-fatal): %s", e, context="CONFIRM")
+            logger.warning(f"Auto-categorization error (non-fatal): {e}")
+
+        db.query(ImportLog).filter(
+            ImportLog.batch_id == batch_id
+        ).update({ImportLog.status: "completed"}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _recover_stale_imports(db: Session, batch_id: Optional[str] = None):
+    """
+    Re-run auto-categorization for imports stuck in "categorizing".
+
+    The task is lost if its process dies (or is frozen) before it ends,
+    which would leave the import log "categorizing" forever.
+    """
+    query = db.query(ImportLog.batch_id).filter(
+        ImportLog.status == "categorizing",
+        ImportLog.imported_at < datetime.utcnow() - STALE_CATEGORIZING_AFTER
+    )
+    if batch_id is not None:
+        query = query.filter(ImportLog.batch_id == batch_id)
+    stale = [row.batch_id for row in query.limit(STALE_IMPORTS_PER_REQUEST)]
+    for stale_batch_id in stale:
+        logger.warning(f"Re-running auto-categorization for stale import {stale_batch_id}")
+        _auto_categorize_task(stale_batch_id)
+    if stale:
+        db.expire_all()
+
+
 @router.post("/confirm", response_model=UploadResult)
 async def confirm_upload(
+    background_tasks: BackgroundTasks,
     file_id: str = Query(..., description="File ID from preview"),
     account_id: Optional[int] = Query(None, description="Existing account ID"),
     auto_categorize: bool = Query(True, description="Auto-apply learned rules"),
@@ -289,41 +630,43 @@ async def confirm_upload(
     or create_account to create a new one.
     """
     start_time = time.time()
-    debug_log(f"=== CONFIRM START === file_id: {file_id}", "CONFIRM")
-    debug_log(f"account_id: {account_id}, auto_categorize: {auto_categorize}", "CONFIRM")
-    debug_log(f"create_account: {create_account}", "CONFIRM")
+    file_id = _check_file_id(file_id)
+    debug_log("=== CONFIRM START === file_id: %s", file_id, context="CONFIRM")
+    debug_log("account_id: %s, auto_categorize: %s", account_id, auto_categorize, context="CONFIRM")
+    debug_log("create_account: %s", create_account, context="CONFIRM")
 
     temp_path = get_temp_file_path(file_id)
-    debug_log(f"Looking for temp file at: {temp_path}", "CONFIRM")
+    debug_log("Looking for temp file at: %s", temp_path, context="CONFIRM")
 
     if not temp_path.exists():
-        debug_log(f"ERROR: Temp file not found!", "CONFIRM")
+        debug_log("ERROR: Temp file not found!", context="CONFIRM")
         raise HTTPException(
             status_code=404,
             detail="Upload session expired. Please upload the file again."
         )
-    debug_log(f"Temp file exists, size: {temp_path.stat().st_size:,} bytes", "CONFIRM")
+    if DEBUG_UPLOAD:
+        debug_log(f"Temp file exists, size: {temp_path.stat().st_size:,} bytes", context="CONFIRM")
     
     try:
         # Get or create account
         account_start = time.time()
-        debug_log(f"Getting/creating account...", "CONFIRM")
+        debug_log("Getting/creating account...", context="CONFIRM")
         if account_id:
-            debug_log(f"Looking up account_id: {account_id}", "CONFIRM")
+            debug_log("Looking up account_id: %s", account_id, context="CONFIRM")
             account = db.query(Account).filter(Account.id == account_id).first()
             if not account:
-                debug_log(f"ERROR: Account not found", "CONFIRM")
+                debug_log("ERROR: Account not found", context="CONFIRM")
                 raise HTTPException(status_code=404, detail="Account not found")
-            debug_log(f"Found account: {account.name} in {time.time()-account_start:.2f}s", "CONFIRM")
+            debug_log("Found account: %s in %.2fs", account.name, time.time()-account_start, context="CONFIRM")
         elif create_account:
-            debug_log(f"Creating new account: {create_account.account_number}", "CONFIRM")
+            debug_log("Creating new account: %s", create_account.account_number, context="CONFIRM")
             # Check if account number already exists
             existing = db.query(Account).filter(
                 Account.account_number == create_account.account_number
             ).first()
 
             if existing:
-                debug_log(f"ERROR: Account already exists", "CONFIRM")
+                debug_log("ERROR: Account already exists", context="CONFIRM")
                 raise HTTPException(
                     status_code=400,
                     detail=f"Account {create_account.account_number} already exists"
@@ -336,105 +679,138 @@ async def confirm_upload(
                 account_type=AccountType(create_account.account_type.value)
             )
             db.add(account)
-            db.commit()
-            db.refresh(account)
-            debug_log(f"Account created with id: {account.id} in {time.time()-account_start:.2f}s", "CONFIRM")
+            db.flush()  # Assigns account.id; committed together with the import
+            debug_log("Account created with id: %s in %.2fs", account.id, time.time()-account_start, context="CONFIRM")
         else:
-            debug_log(f"ERROR: No account_id or create_account provided", "CONFIRM")
+            debug_log("ERROR: No account_id or create_account provided", context="CONFIRM")
             raise HTTPException(
                 status_code=400,
                 detail="Must provide either account_id or create_account"
             )
 
-        # Parse transactions
+        # Reuse the rows parsed during preview; fall back to parsing the file
         parse_start = time.time()
-        debug_log(f"Parsing Excel file...", "CONFIRM")
-        summary, transactions = parse_excel_file(str(temp_path))
-        debug_log(f"Parsed {len(transactions)} transactions in {time.time()-parse_start:.2f}s", "CONFIRM")
+        cache_path = get_parsed_cache_path(file_id)
+        if cache_path.exists():
+            debug_log("Loading parsed transactions from preview...", context="CONFIRM")
+            transactions, file_hash = await asyncio.to_thread(_load_parsed_rows, cache_path)
+        else:
+            debug_log("Parsing Excel file...", context="CONFIRM")
+            summary, transactions = await asyncio.to_thread(parse_excel_file, str(temp_path))
+            file_hash = await asyncio.to_thread(_hash_file, temp_path)
+        debug_log("Loaded %s transactions in %.2fs", len(transactions), time.time()-parse_start, context="CONFIRM")
+
+        # Earliest and latest rows in a single pass each (no sort); on date
+        # ties these pick the same rows a stable sort would put at the ends
+        first_trans = min(transactions, key=transaction_date_key) if transactions else None
+        last_trans = max(reversed(transactions), key=transaction_date_key) if transactions else None
 
         # Determine default classification based on account type
         if account.account_type == AccountType.BUSINESS:
             default_classification = TransactionClassification.BUSINESS
         else:
             default_classification = TransactionClassification.PERSONAL
-        debug_log(f"Default classification: {default_classification.value}", "CONFIRM")
+        debug_log("Default classification: %s", default_classification.value, context="CONFIRM")
 
         # Generate batch ID
         batch_id = str(uuid.uuid4())[:8]
-        debug_log(f"Batch ID: {batch_id}", "CONFIRM")
+        debug_log("Batch ID: %s", batch_id, context="CONFIRM")
 
         # Import transactions, checking for duplicates
         new_count = 0
         duplicate_count = 0
         import_start = time.time()
-        debug_log(f"Starting transaction import for {len(transactions)} transactions...", "CONFIRM")
-
-        # Build a set of existing transaction signatures for O(1) lookup (single query)
-        existing_signatures = set(
-            db.query(
-                Transaction.transaction_date,
-                Transaction.amount,
-                Transaction.details
-            ).filter(
-                Transaction.account_id == account.id
-            ).all()
-        )
-        debug_log(f"Loaded {len(existing_signatures)} existing signatures for duplicate check", "CONFIRM")
+        debug_log("Starting transaction import for %s transactions...", len(transactions), context="CONFIRM")
+
+        # On PostgreSQL the ux_tx_import_dedup index rejects existing rows at
+        # insert time. Elsewhere (or if the index is missing), build a set of
+        # existing transaction signatures for O(1) lookup (single query,
+        # limited to the file's date range)
+        db_dedup = _has_dedup_index(db)
+        existing_signatures = set()
+        if transactions and not db_dedup:
+            existing_signatures = set(
+                db.query(
+                    Transaction.transaction_date,
+                    Transaction.amount,
+                    Transaction.details,
+                    Transaction.balance
+                ).filter(
+                    Transaction.account_id == account.id,
+                    Transaction.transaction_date.between(
+                        first_trans["transaction_date"], last_trans["transaction_date"]
+                    )
+                ).all()
+            )
+        debug_log("Loaded %s existing signatures for duplicate check", len(existing_signatures), context="CONFIRM")
 
         # Process all transactions without DB queries in loop
-        new_transactions = []
+        payloads = []
         for trans_data in transactions:
-            signature = (
-                trans_data["transaction_date"],
-                trans_data["amount"],
-                trans_data.get("details")
-            )
+            signature = transaction_signature(trans_data)
 
             if signature in existing_signatures:
                 duplicate_count += 1
                 continue
 
-            # Create new transaction
-            trans = Transaction(
-                account_id=account.id,
-                transaction_date=trans_data["transaction_date"],
-                processed_date=trans_data.get("processed_date"),
-                transaction_type=trans_data.get("transaction_type"),
-                details=trans_data.get("details"),
-                particulars=trans_data.get("particulars"),
-                code=trans_data.get("code"),
-                reference=trans_data.get("reference"),
-                amount=trans_data["amount"],
-                balance=trans_data.get("balance"),
-                to_from_account=trans_data.get("to_from_account"),
-                conversion_charge=trans_data.get("conversion_charge"),
-                foreign_currency_amount=trans_data.get("foreign_currency_amount"),
-                card_number_last4=trans_data.get("card_number_last4"),
-                classification=default_classification,
-                import_batch_id=batch_id
-            )
-            new_transactions.append(trans)
-            new_count += 1
-
-        # Bulk add all new transactions
-        if new_transactions:
-            db.add_all(new_transactions)
+            payloads.append({
+                "account_id": account.id,
+                "transaction_date": trans_data["transaction_date"],
+                "processed_date": trans_data.get("processed_date"),
+                "transaction_type": trans_data.get("transaction_type"),
+                "details": trans_data.get("details"),
+                "particulars": trans_data.get("particulars"),
+                "code": trans_data.get("code"),
+                "reference": trans_data.get("reference"),
+                "amount": trans_data["amount"],
+                "balance": trans_data.get("balance"),
+                "to_from_account": trans_data.get("to_from_account"),
+                "conversion_charge": trans_data.get("conversion_charge"),
+                "foreign_currency_amount": trans_data.get("foreign_currency_amount"),
+                "card_number_last4": trans_data.get("card_number_last4"),
+                "classification": default_classification,
+                "import_batch_id": batch_id
+            })
+            # Also catches rows repeated within the same file
+            existing_signatures.add(signature)
+
+        # Batched INSERT without per-object unit-of-work overhead; IDs are
+        # not needed here (auto-categorize reloads the batch by import_batch_id)
+        if payloads and db_dedup:
+            inserted = db.execute(
+                pg_insert(Transaction).on_conflict_do_nothing().returning(Transaction.id),
+                payloads
+            ).all()
+            new_count = len(inserted)
+            duplicate_count += len(payloads) - new_count
+        elif payloads:
+            db.bulk_insert_mappings(Transaction, payloads)
+            new_count = len(payloads)
 
         import_elapsed = time.time() - import_start
-        debug_log(f"Import complete in {import_elapsed:.2f}s: {new_count} new, {duplicate_count} duplicates", "CONFIRM")
+        debug_log("Import complete in %.2fs: %s new, %s duplicates", import_elapsed, new_count, duplicate_count, context="CONFIRM")
+
+        # Keep the account's latest transaction current for later previews.
+        # Accounts without it yet (imported before the columns existed) are
+        # backfilled from the table, now that this file's rows are in it.
+        if new_count > 0:
+            if account.last_transaction_date is None:
+                account.last_transaction_date, account.last_balance = _latest_transaction(db, account)
+            elif last_trans["transaction_date"] >= account.last_transaction_date:
+                account.last_transaction_date = last_trans["transaction_date"]
+                account.last_balance = last_trans.get("balance")
 
         # Create import log
-        debug_log(f"Creating import log...", "CONFIRM")
-        sorted_trans = sorted(transactions, key=lambda x: x["transaction_date"])
-        
+        debug_log("Creating import log...", context="CONFIRM")
         import_log = ImportLog(
             batch_id=batch_id,
             filename=temp_path.name,
+            file_hash=file_hash,
             account_id=account.id,
-            date_from=sorted_trans[0]["transaction_date"] if sorted_trans else None,
-            date_to=sorted_trans[-1]["transaction_date"] if sorted_trans else None,
-            opening_balance=sorted_trans[0].get("balance") if sorted_trans else None,
-            closing_balance=sorted_trans[-1].get("balance") if sorted_trans else None,
+            date_from=first_trans["transaction_date"] if first_trans else None,
+            date_to=last_trans["transaction_date"] if last_trans else None,
+            opening_balance=first_trans.get("balance") if first_trans else None,
+            closing_balance=last_trans.get("balance") if last_trans else None,
             total_transactions=len(transactions),
             new_transactions=new_count,
             duplicate_transactions=duplicate_count,
@@ -442,44 +818,31 @@ async def confirm_upload(
         )
         
         db.add(import_log)
-        commit_start = time.time()
-        db.commit()
-        debug_log(f"Database commit complete in {time.time()-commit_start:.2f}s", "CONFIRM")
 
-        # Auto-categorize new transactions using learned rules
+        # Auto-categorize new transactions using learned rules once the
+        # response has been sent (see run_after_response); the import log
+        # reports progress
         if auto_categorize and new_count > 0:
-            cat_start = time.time()
-            debug_log(f"Starting auto-categorization for {new_count} transactions...", "CONFIRM")
-            try:
-                categorizer = TransactionCategorizer(db, use_llm=False)  # Rules only for speed
-                new_transactions = db.query(Transaction).filter(
-                    Transaction.import_batch_id == batch_id
-                ).all()
-
-                categorized_count = 0
-                for trans in new_transactions:
-                    rule = categorizer.find_matching_rule(trans)
-                    if rule and rule.confidence >= 0.8:
-                        trans.classification = rule.classification
-                        trans.category_id = rule.category_id
-                        trans.is_reviewed = True
-                        rule.times_applied += 1
-                        categorized_count += 1
-
-                db.commit()
-                debug_log(f"Auto-categorization complete in {time.time()-cat_start:.2f}s: {categorized_count} categorized", "CONFIRM")
-            except Exception as e:
-                debug_log(f"Auto-categorization error (non-fatal): {e}", "CONFIRM")
-                logger.warning(f"Auto-categorization error (non-fatal): {e}")
+            import_log.status = "categorizing"
+            debug_log("Scheduling auto-categorization for %s transactions...", new_count, context="CONFIRM")
         else:
-            debug_log(f"Skipping auto-categorization (auto_categorize={auto_categorize}, new_count={new_count})", "CONFIRM")
+            debug_log("Skipping auto-categorization (auto_categorize=%s, new_count=%s)", auto_categorize, new_count, context="CONFIRM")
+
+        # Account, transactions and import log in one commit
+        commit_start = time.time()
+        db.commit()
+        debug_log("Database commit complete in %.2fs", time.time()-commit_start, context="CONFIRM")
+
+        if import_log.status == "categorizing":
+            run_after_response(background_tasks, _auto_categorize_task, batch_id)
 
         # Clean up temp file
-        debug_log(f"Cleaning up temp file...", "CONFIRM")
+        debug_log("Cleaning up temp file...", context="CONFIRM")
         os.remove(temp_path)
+        get_parsed_cache_path(file_id).unlink(missing_ok=True)
 
         total_time = time.time() - start_time
-        debug_log(f"=== CONFIRM COMPLETE === {new_count} new, {duplicate_count} duplicates in {total_time:.2f}s", "CONFIRM")
+        debug_log("=== CONFIRM COMPLETE === %s new, %s duplicates in %.2fs", new_count, duplicate_count, total_time, context="CONFIRM")
 
         return UploadResult(
             success=True,
@@ -497,30 +860,50 @@ async def confirm_upload(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error importing transactions: {str(e)}")
     finally:
-        # Clean up temp file if it still exists
-        if temp_path.exists():
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+        # Clean up temp files if they still exist
+        for path in (temp_path, get_parsed_cache_path(file_id)):
+            if path.exists():
+                try:
+                    os.remove(path)
+                except:
+                    pass
 
 
 @router.delete("/cancel/{file_id}")
 async def cancel_upload(file_id: str):
     """Cancel an upload and clean up temporary file."""
-    debug_log(f"Cancel request for file_id: {file_id}", "CANCEL")
+    file_id = _check_file_id(file_id)
+    debug_log("Cancel request for file_id: %s", file_id, context="CANCEL")
     temp_path = get_temp_file_path(file_id)
+    get_parsed_cache_path(file_id).unlink(missing_ok=True)
 
     if temp_path.exists():
         file_size = temp_path.stat().st_size
         os.remove(temp_path)
-        debug_log(f"Removed temp file ({file_size:,} bytes)", "CANCEL")
+        debug_log(f"Removed temp file ({file_size:,} bytes)", context="CANCEL")
         return {"message": "Upload cancelled and temporary file removed"}
 
-    debug_log(f"No temp file found at: {temp_path}", "CANCEL")
+    debug_log("No temp file found at: %s", temp_path, context="CANCEL")
     return {"message": "No temporary file found"}
 
 
+@router.get("/status/{batch_id}")
+def get_import_status(batch_id: str, db: Session = Depends(get_db)):
+    """Get the status of an import ("categorizing" until auto-categorization finishes)."""
+    _recover_stale_imports(db, batch_id)
+    log = db.query(ImportLog).filter(ImportLog.batch_id == batch_id).first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Import not found")
+
+    return {
+        "batch_id": log.batch_id,
+        "status": log.status,
+        "total_transactions": log.total_transactions,
+        "new_transactions": log.new_transactions,
+        "duplicate_transactions": log.duplicate_transactions
+    }
+
+
 @router.get("/history")
 def get_import_history(
     account_id: Optional[int] = None,
@@ -529,7 +912,8 @@ def get_import_history(
 ):
     """Get import history."""
     start_time = time.time()
-    debug_log(f"Fetching import history (account_id={account_id}, limit={limit})", "HISTORY")
+    debug_log("Fetching import history (account_id=%s, limit=%s)", account_id, limit, context="HISTORY")
+    _recover_stale_imports(db)
 
     query = db.query(ImportLog).order_by(ImportLog.imported_at.desc())
 
@@ -537,7 +921,7 @@ def get_import_history(
         query = query.filter(ImportLog.account_id == account_id)
 
     logs = query.limit(limit).all()
-    debug_log(f"Found {len(logs)} import logs in {time.time()-start_time:.2f}s", "HISTORY")
+    debug_log("Found %s import logs in %.2fs", len(logs), time.time()-start_time, context="HISTORY")
 
     return [
         {
@@ -115,6 +115,7 @@ class TransactionListResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None  # Pass as `after` to fetch the next page
 
 
 # Upload Schemas
@@ -195,4 +196,8 @@ class UploadPreview(BaseModel):
     last_imported_balance: Optional[float] = None
     first_new_date: Optional[date] = None
     first_new_balance: Optional[float] = None
+    
+    # Set when the same file was imported before and the counts above come
+    # from that import's log rather than a check against the current table
+    previously_imported_at: Optional[datetime] = None
 
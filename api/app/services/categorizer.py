@@ -11,18 +11,392 @@ import os
 import json
 import re
 import logging
-from typing import Optional, List, Dict, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple, Iterable, Iterator
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 
 from app.models import (
-    Transaction, Category, MerchantRule, Account,
+    Transaction, Category, MerchantRule, Account, LLMCacheEntry,
     TransactionClassification, AccountType
 )
 
 logger = logging.getLogger(__name__)
 
 
+
+# Regex syntax that doesn't affect group nesting, collapsed before the
+# nesting check: escapes, character classes and group prefixes
+REGEX_ESCAPE = re.compile(r"\\.")
+REGEX_CHAR_CLASS = re.compile(r"\[\^?\]?[^\]]*\]")
+REGEX_GROUP_PREFIX = re.compile(r"\(\?(?:[:=!]|<[=!]|P<\w+>)")
+# A repeated group whose body can itself repeat or branch, e.g. (a+)+,
+# (\d+\s?)+, (a+|b)+ or (a|aa)+: the shapes of catastrophic backtracking
+REPEATED_VARIABLE_GROUP = re.compile(r"\([^()]*[+*?}|][^()]*\)[+*{]")
+INNERMOST_GROUP = re.compile(r"\(([^()]*)\)")
+QUANTIFIER_OR_BRANCH = re.compile(r"[+*?}|]")
+
+
+def has_nested_quantifier(pattern: str) -> bool:
+    """
+    Whether a regex repeats a group that can itself repeat or branch.
+    
+    Innermost groups are collapsed one level at a time, so nesting such
+    as ((a)+)+ is caught too. Deliberately conservative: some harmless
+    patterns like (ab|cd)+ are rejected as well.
+    """
+    simplified = REGEX_GROUP_PREFIX.sub("(", REGEX_CHAR_CLASS.sub("a", REGEX_ESCAPE.sub("a", pattern)))
+    while not REPEATED_VARIABLE_GROUP.search(simplified):
+        collapsed = INNERMOST_GROUP.sub(
+            lambda m: "a+" if QUANTIFIER_OR_BRANCH.search(m.group(1)) else "a", simplified
+        )
+        if collapsed == simplified:
+            return False
+        simplified = collapsed
+    return True
+
+
+@lru_cache(maxsize=1024)
+def compile_rule_regex(pattern: str) -> "re.Pattern":
+    """
+    Compiled form of a regex merchant rule, cached by pattern.
+    
+    Raises re.error for invalid patterns and for nested quantifiers
+    (see has_nested_quantifier), which can take exponential time on a
+    non-matching merchant.
+    """
+    if has_nested_quantifier(pattern):
+        raise re.error(f"nested quantifier in {pattern!r}")
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def validate_rule_pattern(match_type: Optional[str], pattern: Optional[str]):
+    """Raise ValueError for a regex rule whose pattern is invalid or unsafe."""
+    if match_type != "regex" or pattern is None:
+        return
+    try:
+        compile_rule_regex(pattern.lower())
+    except re.error as e:
+        raise ValueError(f"Invalid regex pattern: {e}")
+
+
+def has_context_conditions(rule: MerchantRule) -> bool:
+    """Whether the rule also checks account type, amount or day of week."""
+    return bool(
+        rule.account_type
+        or rule.min_amount is not None
+        or rule.max_amount is not None
+        or rule.day_of_week
+    )
+
+
+# Distinct merchants whose rule candidates a RuleIndex remembers
+RULE_CANDIDATES_MEMO_SIZE = 10000
+
+
+class RuleIndex:
+    """
+    Merchant rules bucketed by match type, built once per rules snapshot.
+    
+    Patterns are lowercased (and regexes compiled) up front. Exact rules
+    are found with a dict lookup and startswith rules are bucketed by
+    first character, so only contains/regex rules need a linear scan.
+    """
+    
+    def __init__(self, rules: List[MerchantRule]):
+        self.exact: Dict[str, List[Tuple[int, MerchantRule]]] = {}
+        self.startswith: Dict[str, List[Tuple[int, str, MerchantRule]]] = {}
+        self.contains: List[Tuple[int, str, MerchantRule]] = []
+        self.regex: List[Tuple[int, "re.Pattern", MerchantRule]] = []
+        self._memo: Dict[str, Tuple[MerchantRule, ...]] = {}
+        # Ids of rules with no account/amount/day condition: a pattern
+        # match alone is enough for them
+        self.unconditional = {
+            rule.id for rule in rules if not has_context_conditions(rule)
+        }
+        
+        # Position in the confidence-ordered list decides ties between matches
+        for pos, rule in enumerate(rules):
+            pattern = rule.merchant_pattern.lower()
+            if rule.match_type == "exact":
+                self.exact.setdefault(pattern, []).append((pos, rule))
+            elif rule.match_type == "startswith":
+                self.startswith.setdefault(pattern[:1], []).append((pos, pattern, rule))
+            elif rule.match_type == "regex":
+                try:
+                    self.regex.append((pos, compile_rule_regex(pattern), rule))
+                except re.error as e:
+                    logger.warning(f"Skipping rule {rule.id} with invalid regex: {e}")
+            else:  # contains, and the default for unknown match types
+                self.contains.append((pos, pattern, rule))
+    
+    def candidates(self, merchant: str) -> Tuple[MerchantRule, ...]:
+        """Rules whose pattern matches the lowercased merchant, in rule order."""
+        # Imports repeat the same merchants many times; the pattern part of
+        # a match only depends on the merchant string
+        found = self._memo.get(merchant)
+        if found is None:
+            if len(self._memo) >= RULE_CANDIDATES_MEMO_SIZE:
+                self._memo.clear()
+            found = self._memo[merchant] = self._match(merchant)
+        return found
+    
+    def _match(self, merchant: str) -> Tuple[MerchantRule, ...]:
+        found = list(self.exact.get(merchant, ()))
+        for bucket in {merchant[:1], ""}:
+            found.extend(
+                (pos, rule) for pos, pattern, rule in self.startswith.get(bucket, ())
+                if merchant.startswith(pattern)
+            )
+        found.extend((pos, rule) for pos, pattern, rule in self.contains if pattern in merchant)
+        found.extend((pos, rule) for pos, regex, rule in self.regex if regex.search(merchant))
+        found.sort(key=lambda item: item[0])
+        return tuple(rule for _, rule in found)
+
+
+# Process-wide snapshot of the merchant rules, shared by categorizer
+# instances across requests until the table changes: (fingerprint, rules,
+# index). The rules are detached from any session and must be treated as
+# read-only.
+_rules_snapshot: Tuple[Optional[tuple], List[MerchantRule], Optional[RuleIndex]] = (None, [], None)
+
+# Transactions sent to the LLM per request by categorize_batch
+LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "15"))
+
+# Chunk requests in flight at once; keep under the provider's rate limit
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "4"))
+
+# Models used for categorization. A one-line transaction against a fixed
+# category list doesn't need a large model; override via env if needed.
+CLAUDE_MODEL = os.environ.get("CLAUDE_MODEL", "claude-haiku-4-5-20251001")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
+# Retries per LLM request on rate limits (429), overload (529) and other
+# transient errors. The SDK clients back off exponentially with jitter
+# and honor Retry-After.
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+
+# LLM answers keyed by merchant signature (see _llm_cache_key), shared
+# across requests. Least recently used entries are evicted past the limit.
+# Answers are also written through to the llm_cache table, which serves
+# misses here, so they survive restarts and serverless cold starts.
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "5000"))
+_llm_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+
+# Cache keys looked up per llm_cache query
+LLM_CACHE_LOOKUP_CHUNK = 500
+
+# Store numbers, card suffixes and other digit runs (with a leading "#"),
+# masked out of LLM cache keys
+DIGITS_PATTERN = re.compile(r"#?\d+")
+
+# date.weekday() -> lowercase day name, as rules store it (avoids strftime)
+WEEKDAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Basic keyword rules for common NZ merchants/types, in priority order
+KEYWORD_RULES = [
+    # Food & Dining
+    (["restaurant", "cafe", "coffee", "mcdonald", "burger", "pizza", "sushi", 
+      "thai", "indian", "chinese", "kebab", "subway", "kfc", "nando"], 
+     "Food & Dining", False),
+    
+    # Groceries
+    (["countdown", "new world", "pak n save", "paknsave", "supermarket", 
+      "fresh choice", "four square", "woolworths"], 
+     "Groceries", False),
+    
+    # Transport
+    (["bp", "z energy", "mobil", "caltex", "gull", "fuel", "petrol", 
+      "uber", "taxi", "parking", "parkable", "wilson parking", "auckland transport",
+      "at hop", "snapper"], 
+     "Transport", False),
+    
+    # Home & Garden
+    (["bunnings", "mitre 10", "mitre10", "placemakers", "hammer hardware"], 
+     "Home & Garden", True),  # Mark as personal for business accounts
+    
+    # Utilities
+    (["power", "electricity", "gas", "water", "internet", "spark", "vodafone", 
+      "2degrees", "one nz", "chorus"], 
+     "Utilities", False),
+    
+    # Entertainment
+    (["netflix", "spotify", "disney", "amazon prime", "youtube", "cinema", 
+      "event", "ticketmaster", "imax"], 
+     "Entertainment", True),
+    
+    # Shopping
+    (["amazon", "ebay", "trademe", "kmart", "the warehouse", "farmers", 
+      "briscoes", "rebel sport", "jb hi-fi"], 
+     "Shopping", False),
+    
+    # Bank Fees
+    (["bank fee", "account fee", "overdraft", "monthly fee"], 
+     "Bank Fees", False),
+]
+
+# Keyword -> indexes of the rule groups it proves present: its own group
+# plus those of every keyword that is a prefix of it
+KEYWORD_RULE_POSITIONS: Dict[str, frozenset] = {}
+for _keyword in {kw for keywords, _, _ in KEYWORD_RULES for kw in keywords}:
+    KEYWORD_RULE_POSITIONS[_keyword] = frozenset(
+        position for position, (keywords, _, _) in enumerate(KEYWORD_RULES)
+        if any(_keyword.startswith(kw) for kw in keywords)
+    )
+
+# Single alternation over every keyword. The lookahead reports a match at
+# every offset, and trying the longest keyword first means a shorter one
+# at the same offset is covered by KEYWORD_RULE_POSITIONS.
+KEYWORD_RULE_PATTERN = re.compile("(?=({}))".format("|".join(
+    re.escape(keyword) for keyword in sorted(KEYWORD_RULE_POSITIONS, key=len, reverse=True)
+)))
+
+
+# Whole-word form of the same keywords ("bp" matches "bp connect" but not
+# "bpay"); used to decide whether a keyword hit is specific enough to skip
+# the LLM
+KEYWORD_WORD_PATTERN = re.compile(r"\b(?:{})\b".format("|".join(
+    re.escape(keyword) for keyword in sorted(KEYWORD_RULE_POSITIONS, key=len, reverse=True)
+)))
+
+
+def match_keyword_rules(details: str) -> List[int]:
+    """Indexes into KEYWORD_RULES of every group with a keyword in details, in order."""
+    return sorted(frozenset().union(*(
+        KEYWORD_RULE_POSITIONS[match.group(1)]
+        for match in KEYWORD_RULE_PATTERN.finditer(details)
+    )))
+
+
+# Chain stores whose learned rules drop the location suffix
+CHAIN_PATTERNS = [
+    (re.compile(regex, re.IGNORECASE), simplified)
+    for regex, simplified in [
+        (r"countdown\s+\w+", "Countdown"),
+        (r"new world\s+\w+", "New World"),
+        (r"pak.?n.?save\s+\w+", "Pak n Save"),
+        (r"bp\s+\w+", "BP"),
+        (r"z\s+\w+", "Z "),
+        (r"bunnings\s+\w+", "Bunnings"),
+    ]
+]
+
+# Most categories suggested to the LLM when local signals point to some
+PROMPT_SHORTLIST_SIZE = 5
+
+
+def format_category_list(categories: List[Dict]) -> str:
+    return "\n".join(
+        f"- {cat['name']} (ID: {cat['id']}, {'Income' if cat['is_income'] else 'Expense'})"
+        for cat in categories
+    )
+
+
+@lru_cache(maxsize=8)
+def build_system_prompt(categories: Tuple[Tuple[int, str, bool], ...]) -> str:
+    """
+    Categorization system prompt for a category list, as (id, name,
+    is_income) tuples sorted by id.
+    
+    Keyed on the category fields it shows, so it is rebuilt only when a
+    category changes, and the sorted order keeps the text byte-identical
+    between requests for provider-side prompt caching.
+    """
+    category_list = format_category_list([
+        {"id": cat_id, "name": name, "is_income": is_income}
+        for cat_id, name, is_income in categories
+    ])
+    return f"{CATEGORIZATION_SYSTEM_PROMPT}\n\nAvailable Categories:\n{category_list}"
+
+
+def format_likely_categories(categories: Optional[List[Dict]]) -> str:
+    """User-prompt hint listing shortlisted categories, or "" for none."""
+    if not categories:
+        return ""
+    return f"Most likely categories (from learned rules and merchant keywords):\n{format_category_list(categories)}\n\n"
+
+
+def cached_system_prompt(system_prompt: str) -> List[Dict]:
+    """Claude system block marked for prompt caching."""
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+CATEGORIZATION_SYSTEM_PROMPT = """You are a financial transaction categorizer. Your job is to:
+1. Determine if a transaction is PERSONAL or BUSINESS (especially important for business accounts)
+2. Assign the most appropriate spending category
+
+Context clues for Personal vs Business:
+- Restaurants on evenings/weekends → likely Personal (family dining)
+- Hardware stores (Bunnings, Mitre 10) → likely Personal (home renovation)
+- Office supplies during work hours → likely Business
+- Subscriptions can be either - use your judgment based on the service name
+
+Be conservative: if unsure whether something from a business account is personal, default to BUSINESS."""
+
+# Tool schema that forces Claude's single-transaction answer into a fixed
+# shape, so it arrives as parsed input rather than JSON text
+CATEGORIZATION_TOOL = {
+    "name": "record_categorization",
+    "description": "Record the categorization of the transaction.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "classification": {"type": "string", "enum": ["personal", "business"]},
+            "category_id": {"type": ["integer", "null"]},
+            "category_name": {"type": ["string", "null"]},
+            "confidence": {"type": "number"},
+            "explanation": {"type": "string"}
+        },
+        "required": ["classification", "category_id", "confidence"]
+    }
+}
+
+# Tool schema that forces Claude's batch answer into a fixed shape
+BATCH_RESULTS_TOOL = {
+    "name": "record_categorizations",
+    "description": "Record the categorization of every transaction in the batch.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "transaction_id": {"type": "integer"},
+                        "classification": {"type": "string", "enum": ["personal", "business"]},
+                        "category_id": {"type": ["integer", "null"]},
+                        "category_name": {"type": ["string", "null"]},
+                        "confidence": {"type": "number"},
+                        "explanation": {"type": "string"}
+                    },
+                    "required": ["transaction_id", "classification", "category_id", "confidence"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
+
+
+# LLM clients are shared by every categorizer in the process (one is built
+# per request), so their HTTP connection pools and TLS sessions are reused
+@lru_cache(maxsize=4)
+def get_anthropic_client(api_key: str):
+    from anthropic import Anthropic
+    return Anthropic(api_key=api_key, max_retries=LLM_MAX_RETRIES)
+
+
+@lru_cache(maxsize=4)
+def get_openai_client(api_key: str):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, max_retries=LLM_MAX_RETRIES)
+
+
 class TransactionCategorizer:
     """
     Intelligent transaction categorization with learning capabilities.
@@ -39,6 +413,12 @@ class TransactionCategorizer:
         self.llm_provider = llm_provider
         self.anthropic_client = None
         self.openai_client = None
+        self._rules_cache: Optional[List[MerchantRule]] = None
+        self._rule_index: Optional[RuleIndex] = None
+        self._accounts: Dict[int, Account] = {}  # Accounts seen by this instance
+        self._category_by_name: Optional[Dict[str, Category]] = None
+        self._categories: Optional[List[Dict]] = None
+        self._system_prompt: Optional[str] = None
         
         # Initialize LLM client based on provider
         if use_llm:
@@ -52,8 +432,7 @@ class TransactionCategorizer:
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if api_key:
             try:
-                from anthropic import Anthropic
-                self.anthropic_client = Anthropic(api_key=api_key)
+                self.anthropic_client = get_anthropic_client(api_key)
             except ImportError:
                 logger.warning("Anthropic package not installed. Install with: pip install anthropic")
                 self.use_llm = False
@@ -66,8 +445,7 @@ class TransactionCategorizer:
         api_key = os.environ.get("OPENAI_API_KEY")
         if api_key:
             try:
-                from openai import OpenAI
-                self.openai_client = OpenAI(api_key=api_key)
+                self.openai_client = get_openai_client(api_key)
             except ImportError:
                 logger.warning("OpenAI package not installed. Install with: pip install openai")
                 self.use_llm = False
@@ -75,18 +453,86 @@ class TransactionCategorizer:
             logger.info("OPENAI_API_KEY not set. LLM categorization disabled.")
             self.use_llm = False
     
-    def get_categories(self) -> List[Dict]:
-        """Get all categories from database."""
-        categories = self.db.query(Category).all()
-        return [
-            {
-                "id": cat.id,
-                "name": cat.name,
-                "icon": cat.icon,
-                "is_income": cat.is_income
+    def _get_account(self, account_id: int) -> Optional[Account]:
+        """Look up an account, querying each id at most once per instance."""
+        account = self._accounts.get(account_id)
+        if account is None:
+            account = self.db.query(Account).filter(Account.id == account_id).first()
+            self._accounts[account_id] = account
+        return account
+    
+    def prefetch_accounts(self, transactions: List[Transaction]):
+        """Load the accounts of all given transactions in one query."""
+        missing = {t.account_id for t in transactions} - self._accounts.keys()
+        if missing:
+            for account in self.db.query(Account).filter(Account.id.in_(missing)):
+                self._accounts[account.id] = account
+    
+    def _get_category_map(self) -> Dict[str, Category]:
+        """All categories by name, loaded once per instance."""
+        if self._category_by_name is None:
+            self._category_by_name = {
+                c.name: c for c in self.db.query(Category).options(
+                    load_only(Category.id, Category.name, Category.icon, Category.is_income)
+                )
             }
-            for cat in categories
-        ]
+        return self._category_by_name
+    
+    def get_categories(self) -> List[Dict]:
+        """Get all categories from database (built once per instance; treat as read-only)."""
+        if self._categories is None:
+            self._categories = [
+                {
+                    "id": cat.id,
+                    "name": cat.name,
+                    "icon": cat.icon,
+                    "is_income": cat.is_income
+                }
+                for cat in self._get_category_map().values()
+            ]
+        return self._categories
+    
+    def preload_rules(self) -> List[MerchantRule]:
+        """
+        Load all merchant rules once for this instance.
+
+        Subsequent find_matching_rule calls match against the in-memory
+        list instead of querying per transaction. Use for bulk imports.
+        The list is reused across requests while a cheap fingerprint of
+        the rules table (count, max id, max updated_at) and of the
+        category names is unchanged.
+        """
+        global _rules_snapshot
+        # The snapshot is shared by every request in the process, so read it
+        # in its own session: committed rows only, and the caller's session
+        # is left alone
+        with Session(self.db.get_bind()) as snapshot_db:
+            fingerprint = (
+                tuple(snapshot_db.query(
+                    func.count(MerchantRule.id),
+                    func.max(MerchantRule.id),
+                    func.max(MerchantRule.updated_at)
+                ).one()),
+                # Categories have no updated_at; renames show up in rule results
+                tuple(snapshot_db.query(Category.id, Category.name).order_by(Category.id))
+            )
+
+            if _rules_snapshot[0] != fingerprint:
+                rules = snapshot_db.query(MerchantRule).options(
+                    joinedload(MerchantRule.category)
+                ).order_by(
+                    MerchantRule.confidence.desc()
+                ).all()
+                _rules_snapshot = (fingerprint, rules, RuleIndex(rules))
+
+        _, self._rules_cache, self._rule_index = _rules_snapshot
+        return self._rules_cache
+    
+    def _get_rules(self) -> List[MerchantRule]:
+        """Cached rule list for this instance (see preload_rules)."""
+        if self._rules_cache is None:
+            self.preload_rules()
+        return self._rules_cache
     
     def find_matching_rule(self, transaction: Transaction) -> Optional[MerchantRule]:
         """
@@ -97,46 +543,21 @@ class TransactionCategorizer:
         2. Contains match
         3. Pattern match with context (amount, day of week, etc.)
         """
-        merchant = transaction.details or ""
-        
-        # Get all rules, ordered by specificity (more conditions = more specific)
-        rules = self.db.query(MerchantRule).order_by(
-            MerchantRule.confidence.desc()
-        ).all()
+        merchant = (transaction.details or "").lower()
         
-        for rule in rules:
-            if self._rule_matches(rule, transaction):
+        # Only rules whose pattern matches, still in confidence order
+        self._get_rules()
+        index = self._rule_index
+        for rule in index.candidates(merchant):
+            if rule.id in index.unconditional or self._rule_context_matches(rule, transaction):
                 return rule
         
         return None
     
-    def _rule_matches(self, rule: MerchantRule, transaction: Transaction) -> bool:
-        """Check if a rule matches a transaction."""
-        merchant = (transaction.details or "").lower()
-        pattern = rule.merchant_pattern.lower()
-        
-        # Check merchant pattern
-        if rule.match_type == "exact":
-            if merchant != pattern:
-                return False
-        elif rule.match_type == "contains":
-            if pattern not in merchant:
-                return False
-        elif rule.match_type == "startswith":
-            if not merchant.startswith(pattern):
-                return False
-        elif rule.match_type == "regex":
-            if not re.search(pattern, merchant, re.IGNORECASE):
-                return False
-        else:  # default to contains
-            if pattern not in merchant:
-                return False
-        
-        # Check optional context conditions
+    def _rule_context_matches(self, rule: MerchantRule, transaction: Transaction) -> bool:
+        """Check a rule's optional context conditions (account, amount, day)."""
         if rule.account_type:
-            account = self.db.query(Account).filter(
-                Account.id == transaction.account_id
-            ).first()
+            account = self._get_account(transaction.account_id)
             if account and account.account_type != rule.account_type:
                 return False
         
@@ -149,7 +570,7 @@ class TransactionCategorizer:
                 return False
         
         if rule.day_of_week:
-            trans_day = transaction.transaction_date.strftime("%A").lower()
+            trans_day = WEEKDAY_NAMES[transaction.transaction_date.weekday()]
             if rule.day_of_week == "weekend":
                 if trans_day not in ["saturday", "sunday"]:
                     return False
@@ -161,6 +582,108 @@ class TransactionCategorizer:
         
         return True
     
+    def _llm_cache_key(self, transaction: Transaction, is_business_account: bool) -> tuple:
+        """Signature under which an LLM answer is reused: merchant with digits
+        masked (store numbers, card suffixes) and whitespace collapsed,
+        direction and account type."""
+        merchant = " ".join(DIGITS_PATTERN.sub("#", (transaction.details or "").lower()).split())
+        return (merchant, "credit" if transaction.amount >= 0 else "debit", bool(is_business_account))
+    
+    def _get_cached_llm_results(self, keys: Iterable[tuple]) -> Dict[tuple, Dict]:
+        """
+        Cached LLM answers for the given keys (copies), from memory or else
+        the llm_cache table. Entries read from the table are kept in memory.
+        """
+        found = {}
+        missing = []
+        for key in set(keys):
+            result = _llm_cache.get(key)
+            if result is None:
+                missing.append(key)
+            else:
+                _llm_cache.move_to_end(key)
+                found[key] = dict(result)
+        
+        if missing:
+            keys_by_name = {self._llm_cache_name(key): key for key in missing}
+            names = list(keys_by_name)
+            category_ids = {cat["id"] for cat in self.get_categories()}
+            try:
+                for start in range(0, len(names), LLM_CACHE_LOOKUP_CHUNK):
+                    for entry in self.db.query(LLMCacheEntry).filter(
+                        LLMCacheEntry.cache_key.in_(names[start:start + LLM_CACHE_LOOKUP_CHUNK])
+                    ):
+                        # Skip answers pointing at a since-deleted category
+                        if entry.category_id is not None and entry.category_id not in category_ids:
+                            continue
+                        result = {
+                            "classification": entry.classification,
+                            "category_id": entry.category_id,
+                            "category_name": entry.category_name,
+                            "confidence": entry.confidence,
+                            "source": "llm",
+                            "explanation": entry.explanation
+                        }
+                        key = keys_by_name[entry.cache_key]
+                        self._remember_llm_result(key, result)
+                        found[key] = dict(result)
+            except Exception as e:
+                logger.error(f"LLM cache lookup error: {e}")
+        
+        return found
+    
+    def _cache_llm_results(self, results: Dict[tuple, Dict]):
+        """Keep LLM answers in memory and write them through to llm_cache."""
+        # Only real LLM answers; error fallbacks must not be reused
+        results = {key: result for key, result in results.items() if result.get("source") == "llm"}
+        if not results:
+            return
+        
+        rows = []
+        for key, result in results.items():
+            self._remember_llm_result(key, result)
+            rows.append({
+                "cache_key": self._llm_cache_name(key),
+                "classification": result.get("classification") or "personal",
+                "category_id": result.get("category_id"),
+                "category_name": result.get("category_name"),
+                "confidence": result.get("confidence"),
+                "explanation": result.get("explanation"),
+                "updated_at": datetime.utcnow()
+            })
+        
+        # Upsert on a separate connection so the caller's transaction is
+        # neither committed nor rolled back by it
+        engine = self.db.get_bind()
+        insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(LLMCacheEntry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LLMCacheEntry.cache_key],
+            set_={
+                column: stmt.excluded[column]
+                for column in ("classification", "category_id", "category_name",
+                               "confidence", "explanation", "updated_at")
+            }
+        )
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception as e:
+            logger.error(f"LLM cache write error: {e}")
+    
+    def _remember_llm_result(self, key: tuple, result: Dict):
+        _llm_cache[key] = {k: v for k, v in result.items() if k != "transaction_id"}
+        _llm_cache.move_to_end(key)
+        while len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+    
+    @staticmethod
+    def _llm_cache_name(key: tuple) -> str:
+        """llm_cache.cache_key for an _llm_cache_key tuple."""
+        merchant, direction, is_business_account = key
+        account_type = "business" if is_business_account else "personal"
+        return f"{direction}|{account_type}|{merchant}"[:300]
+    
     def categorize_transaction(
         self, 
         transaction: Transaction,
@@ -175,14 +698,12 @@ class TransactionCategorizer:
             "category_id": int | None,
             "category_name": str | None,
             "confidence": float,
-            "source": "rule" | "llm" | "default",
+            "source": "rule" | "basic" | "llm" | "default",
             "explanation": str
         }
         """
         # Get account info
-        account = self.db.query(Account).filter(
-            Account.id == transaction.account_id
-        ).first()
+        account = self._get_account(transaction.account_id)
         
         is_business_account = account and account.account_type == AccountType.BUSINESS
         
@@ -199,16 +720,47 @@ class TransactionCategorizer:
                     "explanation": f"Matched rule: '{rule.merchant_pattern}'"
                 }
         
-        # Step 2: Use LLM if available
-        if self.use_llm:
+        # Step 2: Use LLM if available, unless a keyword makes the answer
+        # obvious, reusing the answer for a merchant already seen
+        if self.use_llm and (self.anthropic_client or self.openai_client):
+            if not force_llm:
+                result = self._categorize_by_keyword(transaction, is_business_account)
+                if result is not None:
+                    return result
+            cache_key = self._llm_cache_key(transaction, is_business_account)
+            result = self._get_cached_llm_results([cache_key]).get(cache_key)
+            if result is not None:
+                return result
             if self.anthropic_client:
-                return self._categorize_with_claude(transaction, is_business_account)
-            elif self.openai_client:
-                return self._categorize_with_openai(transaction, is_business_account)
+                result = self._categorize_with_claude(transaction, is_business_account)
+            else:
+                result = self._categorize_with_openai(transaction, is_business_account)
+            self._cache_llm_results({cache_key: result})
+            return result
         
         # Step 3: Fallback to basic rules
         return self._categorize_with_basic_rules(transaction, is_business_account)
     
+    def _categorize_by_keyword(self, transaction: Transaction, is_business_account: bool) -> Optional[Dict]:
+        """
+        Keyword answer for transactions obvious enough to skip the LLM.
+        
+        Only for personal accounts (the personal/business call on a business
+        account is left to the LLM), and only when every keyword in the
+        merchant points at the same group and at least one matches as a
+        whole word. Returns None otherwise.
+        """
+        if is_business_account:
+            return None
+        details = (transaction.details or "").lower()
+        if len(match_keyword_rules(details)) != 1 or not KEYWORD_WORD_PATTERN.search(details):
+            return None
+        result = self._categorize_with_basic_rules(transaction, is_business_account)
+        if not result["category_id"]:
+            return None
+        result["source"] = "basic"
+        return result
+    
     def categorize_with_rules_only(self, transaction: Transaction) -> Dict:
         """
         Fast categorization using only learned rules and basic pattern matching.
@@ -225,9 +777,7 @@ class TransactionCategorizer:
         }
         """
         # Get account info
-        account = self.db.query(Account).filter(
-            Account.id == transaction.account_id
-        ).first()
+        account = self._get_account(transaction.account_id)
         
         is_business_account = account and account.account_type == AccountType.BUSINESS
         
@@ -259,66 +809,201 @@ class TransactionCategorizer:
             "explanation": "No matching rules. Click 'Get AI Suggestion' for smart categorization."
         }
     
-    def _build_categorization_prompt(self, transaction: Transaction, is_business_account: bool) -> tuple:
-        """Build the system and user prompts for categorization."""
-        categories = self.get_categories()
-        category_list = "\n".join([
-            f"- {cat['name']} (ID: {cat['id']}, {'Income' if cat['is_income'] else 'Expense'})"
-            for cat in categories
-        ])
-        
-        # Build context
-        context = {
-            "date": transaction.transaction_date.isoformat(),
-            "day_of_week": transaction.transaction_date.strftime("%A"),
+    def _get_system_prompt(self) -> str:
+        """
+        System prompt with the full category list, built once per instance.
+        
+        It is identical for every request, so the provider can cache it as
+        a prompt prefix; only the transactions vary in the user message.
+        """
+        if self._system_prompt is None:
+            self._system_prompt = build_system_prompt(tuple(sorted(
+                (cat["id"], cat["name"], cat["is_income"]) for cat in self.get_categories()
+            )))
+        return self._system_prompt
+    
+    def _shortlist_categories(self, transaction: Transaction, categories: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Narrow down the likely categories using local signals.
+        
+        Takes the categories of learned rules whose pattern matches the
+        merchant and of the basic keyword groups it hits, plus an "Other"
+        category as an escape hatch. Returns None when nothing local
+        matches, in which case no hint is added to the prompt.
+        """
+        merchant = (transaction.details or "").lower()
+        self._get_rules()
+        names = []
+        for rule in self._rule_index.candidates(merchant):
+            if rule.category is not None and rule.category.name not in names:
+                names.append(rule.category.name)
+        for position in match_keyword_rules(merchant):
+            if KEYWORD_RULES[position][1] not in names:
+                names.append(KEYWORD_RULES[position][1])
+        if not names:
+            return None
+        
+        names = names[:PROMPT_SHORTLIST_SIZE]
+        names.append("Other Income" if transaction.amount >= 0 else "Other Expenses")
+        return [cat for cat in categories if cat["name"] in names]
+    
+    def _prompt_fields(self, transaction: Transaction, is_business_account: bool) -> Dict:
+        """Compact description of a transaction for LLM prompts; empty fields are left out."""
+        fields = {
+            "date": f"{transaction.transaction_date.isoformat()} {transaction.transaction_date.strftime('%A')}",
             "merchant": transaction.details or "Unknown",
             "type": transaction.transaction_type,
-            "amount": transaction.amount,
+            "amount": f"{transaction.amount:.2f}",
             "particulars": transaction.particulars,
             "code": transaction.code,
             "reference": transaction.reference,
-            "is_business_account": is_business_account
+            "account": "business" if is_business_account else "personal"
         }
+        return {key: value for key, value in fields.items() if value}
+    
+    def _build_categorization_prompt(self, transaction: Transaction, is_business_account: bool) -> tuple:
+        """Build the system and user prompts for categorization."""
+        likely_categories = self._shortlist_categories(transaction, self.get_categories())
         
-        system_prompt = """You are a financial transaction categorizer. Your job is to:
-1. Determine if a transaction is PERSONAL or BUSINESS (especially important for business accounts)
-2. Assign the most appropriate spending category
-
-Context clues for Personal vs Business:
-- Restaurants on evenings/weekends → likely Personal (family dining)
-- Hardware stores (Bunnings, Mitre 10) → likely Personal (home renovation)
-- Office supplies during work hours → likely Business
-- Subscriptions can be either - use your judgment based on the service name
-
-Be conservative: if unsure whether something from a business account is personal, default to BUSINESS.
-
-You MUST respond with ONLY valid JSON, no other text."""
-
-        user_prompt = f"""Categorize this transaction:
-
-Transaction Details:
-- Date: {context['date']} ({context['day_of_week']})
-- Merchant/Details: {context['merchant']}
-- Type: {context['type']}
-- Amount: ${abs(context['amount']):.2f} ({'debit' if context['amount'] < 0 else 'credit'})
-- Particulars: {context['particulars'] or 'N/A'}
-- Code: {context['code'] or 'N/A'}
-- Reference: {context['reference'] or 'N/A'}
-- Account Type: {'BUSINESS' if is_business_account else 'PERSONAL'}
+        system_prompt = self._get_system_prompt()
+        
+        details = "\n".join(
+            f"{key}: {value}"
+            for key, value in self._prompt_fields(transaction, is_business_account).items()
+        )
+        user_prompt = f"""Categorize this transaction (negative amount = debit):
 
-Available Categories:
-{category_list}
+{details}
 
-Respond with ONLY this JSON structure (no other text):
-{{
+{format_likely_categories(likely_categories)}"""
+        
+        # Claude answers through a forced tool call, so the format is only
+        # spelled out for OpenAI
+        if self.anthropic_client is None:
+            user_prompt += """Respond with ONLY this JSON structure (no other text):
+{
     "classification": "personal" or "business",
     "category_id": <category ID number>,
     "category_name": "<category name>",
     "confidence": <0.0 to 1.0>,
     "explanation": "<brief explanation>"
-}}"""
+}"""
         
-        return system_prompt, user_prompt
+        return system_prompt, user_prompt.rstrip()
+    
+    def _build_batch_prompt(
+        self,
+        transactions: List[Transaction],
+        business_account_ids: set,
+        system_prompt: str,
+        likely_categories: Optional[List[Dict]]
+    ) -> tuple:
+        """Build the system and user prompts for categorizing several transactions at once."""
+        items = [
+            {"transaction_id": t.id, **self._prompt_fields(t, t.account_id in business_account_ids)}
+            for t in transactions
+        ]
+        
+        user_prompt = f"""Categorize each of these transactions (negative amount = debit):
+
+{json.dumps(items, separators=(",", ":"))}
+
+{format_likely_categories(likely_categories)}"""
+        
+        # Claude answers through a forced tool call, so the format is only
+        # spelled out for OpenAI
+        if self.anthropic_client is None:
+            user_prompt += """Respond with ONLY this JSON structure (no other text), one entry per transaction:
+{
+    "results": [
+        {
+            "transaction_id": <transaction_id from the input>,
+            "classification": "personal" or "business",
+            "category_id": <category ID number>,
+            "category_name": "<category name>",
+            "confidence": <0.0 to 1.0>,
+            "explanation": "<brief explanation>"
+        }
+    ]
+}"""
+        
+        return system_prompt, user_prompt.rstrip()
+    
+    def _categorize_chunk_with_llm(
+        self,
+        transactions: List[Transaction],
+        business_account_ids: set,
+        system_prompt: str,
+        likely_categories: Optional[List[Dict]]
+    ) -> Dict[int, Dict]:
+        """
+        Categorize a chunk of transactions with a single LLM request.
+        
+        Returns results keyed by transaction id. Transactions missing from
+        the answer (or the whole chunk, on error) are left to the caller.
+        Makes no database queries, so chunks can run in worker threads.
+        """
+        system_prompt, user_prompt = self._build_batch_prompt(
+            transactions, business_account_ids, system_prompt, likely_categories
+        )
+        max_tokens = 120 * len(transactions) + 100
+        
+        try:
+            if self.anthropic_client:
+                response = self.anthropic_client.messages.create(
+                    model=CLAUDE_MODEL,
+                    max_tokens=max_tokens,
+                    system=cached_system_prompt(system_prompt),
+                    messages=[
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    tools=[BATCH_RESULTS_TOOL],
+                    tool_choice={"type": "tool", "name": BATCH_RESULTS_TOOL["name"]}
+                )
+                tool_input = next(
+                    block.input for block in response.content if block.type == "tool_use"
+                )
+                results = tool_input["results"]
+                default_explanation = "Categorized by Claude"
+            else:
+                response = self.openai_client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.3,
+                    max_tokens=max_tokens
+                )
+                results = json.loads(response.choices[0].message.content)["results"]
+                default_explanation = "Categorized by GPT"
+            
+        except Exception as e:
+            logger.error(f"Batch LLM categorization error: {e}")
+            return {}
+        
+        # Only ids sent in this chunk count: a hallucinated or shifted id
+        # must not overwrite the answer for a row in another chunk, or one
+        # already answered by rules or the cache. Those rows stay missing.
+        chunk_ids = {trans.id for trans in transactions}
+        chunk_results = {}
+        for result in results:
+            try:
+                transaction_id = int(result.get("transaction_id"))
+            except (TypeError, ValueError):
+                continue
+            if transaction_id not in chunk_ids or transaction_id in chunk_results:
+                continue
+            chunk_results[transaction_id] = {
+                "classification": result.get("classification", "personal"),
+                "category_id": result.get("category_id"),
+                "category_name": result.get("category_name"),
+                "confidence": result.get("confidence", 0.7),
+                "source": "llm",
+                "explanation": result.get("explanation", default_explanation)
+            }
+        return chunk_results
     
     def _categorize_with_claude(
         self, 
@@ -330,24 +1015,20 @@ Respond with ONLY this JSON structure (no other text):
 
         try:
             response = self.anthropic_client.messages.create(
-                model="claude-sonnet-4-20250514",  # Latest Claude model
-                max_tokens=300,
-                system=system_prompt,
+                model=CLAUDE_MODEL,
+                max_tokens=200,
+                system=cached_system_prompt(system_prompt),
                 messages=[
                     {"role": "user", "content": user_prompt}
-                ]
+                ],
+                tools=[CATEGORIZATION_TOOL],
+                tool_choice={"type": "tool", "name": CATEGORIZATION_TOOL["name"]}
             )
             
-            # Extract text from response
-            response_text = response.content[0].text.strip()
-            
-            # Parse JSON from response (handle potential markdown code blocks)
-            if response_text.startswith("```"):
-                # Remove markdown code block
-                lines = response_text.split("\n")
-                response_text = "\n".join(lines[1:-1])
-            
-            result = json.loads(response_text)
+            # The forced tool call carries the answer as already-parsed input
+            result = next(
+                block.input for block in response.content if block.type == "tool_use"
+            )
             
             return {
                 "classification": result.get("classification", "personal"),
@@ -372,7 +1053,7 @@ Respond with ONLY this JSON structure (no other text):
 
         try:
             response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",  # Cost-effective model
+                model=OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -413,73 +1094,29 @@ Respond with ONLY this JSON structure (no other text):
         confidence = 0.5
         explanation = "Default classification"
         
-        # Basic keyword rules for common NZ merchants/types
-        keyword_rules = [
-            # Food & Dining
-            (["restaurant", "cafe", "coffee", "mcdonald", "burger", "pizza", "sushi", 
-              "thai", "indian", "chinese", "kebab", "subway", "kfc", "nando"], 
-             "Food & Dining", False),
-            
-            # Groceries
-            (["countdown", "new world", "pak n save", "paknsave", "supermarket", 
-              "fresh choice", "four square", "woolworths"], 
-             "Groceries", False),
-            
-            # Transport
-            (["bp", "z energy", "mobil", "caltex", "gull", "fuel", "petrol", 
-              "uber", "taxi", "parking", "parkable", "wilson parking", "auckland transport",
-              "at hop", "snapper"], 
-             "Transport", False),
-            
-            # Home & Garden
-            (["bunnings", "mitre 10", "mitre10", "placemakers", "hammer hardware"], 
-             "Home & Garden", True),  # Mark as personal for business accounts
+        # One sweep over the merchant finds every keyword; groups are then
+        # tried in their original order
+        for position in match_keyword_rules(details):
+            _, cat_name, force_personal = KEYWORD_RULES[position]
+            # Find category
+            category = self._get_category_map().get(cat_name)
             
-            # Utilities
-            (["power", "electricity", "gas", "water", "internet", "spark", "vodafone", 
-              "2degrees", "one nz", "chorus"], 
-             "Utilities", False),
-            
-            # Entertainment
-            (["netflix", "spotify", "disney", "amazon prime", "youtube", "cinema", 
-              "event", "ticketmaster", "imax"], 
-             "Entertainment", True),
-            
-            # Shopping
-            (["amazon", "ebay", "trademe", "kmart", "the warehouse", "farmers", 
-              "briscoes", "rebel sport", "jb hi-fi"], 
-             "Shopping", False),
-            
-            # Bank Fees
-            (["bank fee", "account fee", "overdraft", "monthly fee"], 
-             "Bank Fees", False),
-        ]
-        
-        for keywords, cat_name, force_personal in keyword_rules:
-            if any(kw in details for kw in keywords):
-                # Find category
-                category = self.db.query(Category).filter(
-                    Category.name == cat_name
-                ).first()
+            if category:
+                category_id = category.id
+                category_name = cat_name
+                confidence = 0.7
+                explanation = f"Matched keyword in merchant name"
                 
-                if category:
-                    category_id = category.id
-                    category_name = cat_name
-                    confidence = 0.7
-                    explanation = f"Matched keyword in merchant name"
-                    
-                    if force_personal and is_business_account:
-                        classification = "personal"
-                        explanation += " (typically personal expense)"
-                    
-                    break
+                if force_personal and is_business_account:
+                    classification = "personal"
+                    explanation += " (typically personal expense)"
+                
+                break
         
         # Check transaction type for income
         if trans_type in ["direct credit", "payment received", "salary", "wages"]:
             classification = "personal"
-            category = self.db.query(Category).filter(
-                Category.name == "Salary"
-            ).first()
+            category = self._get_category_map().get("Salary")
             if category:
                 category_id = category.id
                 category_name = "Salary"
@@ -518,6 +1155,61 @@ Respond with ONLY this JSON structure (no other text):
             MerchantRule.match_type == "exact"
         ).first()
         
+        rule = self._record_feedback(existing_rule, merchant, classification, category_id, user_confirmed)
+        self.db.commit()
+        if rule is not existing_rule:
+            self.db.refresh(rule)
+        self._rules_cache = None
+        
+        return rule
+    
+    def learn_from_feedback_bulk(
+        self,
+        feedback: List[Tuple[Transaction, TransactionClassification, Optional[int]]],
+        user_confirmed: bool = True
+    ) -> List[Optional[MerchantRule]]:
+        """
+        Learn from many (transaction, classification, category_id) items.
+        
+        Same outcome as calling learn_from_feedback for each item in order,
+        but existing rules are looked up in one query and everything is
+        committed once at the end.
+        """
+        merchants = {trans.details.strip() for trans, _, _ in feedback if trans.details}
+        exact_rules: Dict[str, MerchantRule] = {}
+        if merchants:
+            for rule in self.db.query(MerchantRule).filter(
+                MerchantRule.merchant_pattern.in_(merchants),
+                MerchantRule.match_type == "exact"
+            ).order_by(MerchantRule.id):
+                exact_rules.setdefault(rule.merchant_pattern, rule)
+        
+        rules = []
+        for trans, classification, category_id in feedback:
+            if not trans.details:
+                rules.append(None)
+                continue
+            merchant = trans.details.strip()
+            rule = self._record_feedback(
+                exact_rules.get(merchant), merchant, classification, category_id, user_confirmed
+            )
+            if rule.match_type == "exact":
+                exact_rules.setdefault(merchant, rule)
+            rules.append(rule)
+        
+        self.db.commit()
+        self._rules_cache = None
+        return rules
+    
+    def _record_feedback(
+        self,
+        existing_rule: Optional[MerchantRule],
+        merchant: str,
+        classification: TransactionClassification,
+        category_id: Optional[int],
+        user_confirmed: bool
+    ) -> MerchantRule:
+        """Update the merchant's existing exact rule, or add a new rule (uncommitted)."""
         if existing_rule:
             # Update existing rule
             if user_confirmed:
@@ -532,7 +1224,6 @@ Respond with ONLY this JSON structure (no other text):
                     existing_rule.classification = classification
                     existing_rule.category_id = category_id
             
-            self.db.commit()
             return existing_rule
         
         # Create new rule
@@ -541,17 +1232,8 @@ Respond with ONLY this JSON structure (no other text):
         pattern = merchant
         
         # Simplify pattern for chain stores (remove location identifiers)
-        chain_patterns = [
-            (r"countdown\s+\w+", "Countdown"),
-            (r"new world\s+\w+", "New World"),
-            (r"pak.?n.?save\s+\w+", "Pak n Save"),
-            (r"bp\s+\w+", "BP"),
-            (r"z\s+\w+", "Z "),
-            (r"bunnings\s+\w+", "Bunnings"),
-        ]
-        
-        for regex, simplified in chain_patterns:
-            if re.search(regex, merchant, re.IGNORECASE):
+        for regex, simplified in CHAIN_PATTERNS:
+            if regex.search(merchant):
                 pattern = simplified
                 match_type = "contains"
                 break
@@ -567,9 +1249,6 @@ Respond with ONLY this JSON structure (no other text):
         )
         
         self.db.add(new_rule)
-        self.db.commit()
-        self.db.refresh(new_rule)
-        
         return new_rule
     
     def categorize_batch(
@@ -582,35 +1261,135 @@ Respond with ONLY this JSON structure (no other text):
         
         If apply_rules_only=True, only uses learned rules (faster, no LLM calls).
         """
-        results = []
+        return list(self.iter_categorize_batch(transactions, apply_rules_only))
+    
+    def iter_categorize_batch(
+        self,
+        transactions: Iterable[Transaction],
+        apply_rules_only: bool = False
+    ) -> Iterator[Dict]:
+        """
+        Yield one categorize_batch result per transaction, in input order.
         
-        for trans in transactions:
-            if apply_rules_only:
+        With apply_rules_only=True the input is consumed lazily, so it can
+        be a streaming query (e.g. .yield_per(500)) and results can be
+        written out as they are produced. The LLM path needs the whole
+        batch up front to build its chunks.
+        """
+        if apply_rules_only:
+            for trans in transactions:
                 rule = self.find_matching_rule(trans)
                 if rule:
-                    results.append({
+                    yield {
                         "transaction_id": trans.id,
                         "classification": rule.classification.value,
                         "category_id": rule.category_id,
                         "category_name": rule.category.name if rule.category else None,
                         "confidence": rule.confidence,
                         "source": "rule"
-                    })
+                    }
                 else:
-                    results.append({
+                    yield {
                         "transaction_id": trans.id,
                         "classification": None,
                         "category_id": None,
                         "category_name": None,
                         "confidence": 0,
                         "source": "none"
-                    })
+                    }
+            return
+        
+        transactions = list(transactions)
+        self.prefetch_accounts(transactions)
+        business_account_ids = {
+            account.id for account in self._accounts.values()
+            if account and account.account_type == AccountType.BUSINESS
+        }
+        
+        # Learned rules first; everything else goes to the LLM in chunks of
+        # LLM_BATCH_SIZE (one request per chunk instead of per transaction)
+        results_by_id = {}
+        pending = []
+        for trans in transactions:
+            rule = self.find_matching_rule(trans)
+            if rule and rule.confidence >= 0.8:
+                results_by_id[trans.id] = {
+                    "classification": rule.classification.value,
+                    "category_id": rule.category_id,
+                    "category_name": rule.category.name if rule.category else None,
+                    "confidence": rule.confidence,
+                    "source": "rule",
+                    "explanation": f"Matched rule: '{rule.merchant_pattern}'"
+                }
             else:
-                result = self.categorize_transaction(trans)
-                result["transaction_id"] = trans.id
-                results.append(result)
+                pending.append(trans)
+        
+        if pending and self.use_llm and (self.anthropic_client or self.openai_client):
+            # Obvious keyword matches never reach the LLM
+            remaining = []
+            for trans in pending:
+                result = self._categorize_by_keyword(trans, trans.account_id in business_account_ids)
+                if result is not None:
+                    results_by_id[trans.id] = result
+                else:
+                    remaining.append(trans)
+            pending = remaining
+            cache_keys = {
+                trans.id: self._llm_cache_key(trans, trans.account_id in business_account_ids)
+                for trans in pending
+            }
+            cached = self._get_cached_llm_results(cache_keys.values())
+            uncached = []
+            for trans in pending:
+                result = cached.get(cache_keys[trans.id])
+                if result is not None:
+                    results_by_id[trans.id] = dict(result)
+                else:
+                    uncached.append(trans)
+            pending = uncached
+        
+        if pending and self.use_llm and (self.anthropic_client or self.openai_client):
+            categories = self.get_categories()
+            system_prompt = self._get_system_prompt()
+            chunks = [
+                pending[start:start + LLM_BATCH_SIZE]
+                for start in range(0, len(pending), LLM_BATCH_SIZE)
+            ]
+            # A chunk only gets a likely-category hint when every transaction
+            # in it has a shortlist
+            chunk_categories = []
+            for chunk in chunks:
+                shortlists = [self._shortlist_categories(trans, categories) for trans in chunk]
+                if all(shortlists):
+                    names = {cat["name"] for shortlist in shortlists for cat in shortlist}
+                    chunk_categories.append([cat for cat in categories if cat["name"] in names])
+                else:
+                    chunk_categories.append(None)
+            # Requests are latency-bound, so overlap them on a small pool
+            with ThreadPoolExecutor(max_workers=min(LLM_CONCURRENCY, len(chunks))) as pool:
+                for chunk_results in pool.map(
+                    lambda chunk, chunk_cats: self._categorize_chunk_with_llm(
+                        chunk, business_account_ids, system_prompt, chunk_cats
+                    ),
+                    chunks,
+                    chunk_categories
+                ):
+                    results_by_id.update(chunk_results)
+            self._cache_llm_results({
+                cache_keys[trans.id]: results_by_id[trans.id]
+                for trans in pending if trans.id in results_by_id
+            })
         
-        return results
+        for trans in transactions:
+            result = results_by_id.get(trans.id)
+            if result is None:
+                # No batch answer (no LLM, failed chunk, bad response): fall
+                # back to keyword rules rather than one LLM call per row
+                result = self._categorize_with_basic_rules(
+                    trans, trans.account_id in business_account_ids
+                )
+            result["transaction_id"] = trans.id
+            yield result
     
     def get_uncategorized_transactions(
         self,
@@ -618,7 +1397,9 @@ Respond with ONLY this JSON structure (no other text):
         limit: int = 50
     ) -> List[Transaction]:
         """Get transactions that need categorization."""
-        query = self.db.query(Transaction).filter(
+        query = self.db.query(Transaction).options(
+            selectinload(Transaction.account)
+        ).filter(
             Transaction.is_reviewed == False
         )
         
@@ -1,11 +1,34 @@
 """Excel file parser for bank transaction exports."""
 import re
 from datetime import datetime
+from operator import itemgetter
 from typing import List, Dict, Tuple, Optional
-from openpyxl import load_workbook
 from pathlib import Path
 
 
+# Filename: account_number_Transactions_date-from_date-to
+FILENAME_PATTERN = re.compile(r'^([\d-]+)_Transactions_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})$')
+
+# Bare account number at the start of a filename
+ACCOUNT_NUMBER_PATTERN = re.compile(r'^([\d]+-[\d]+-[\d]+-[\d]+)')
+
+# Masked card number in details: 4835-****-****-3704
+CARD_LAST4_PATTERN = re.compile(r'\d{4}-\*{4}-\*{4}-(\d{4})')
+# Literal substring present in every CARD_LAST4_PATTERN match
+CARD_MASK = '-****-'
+
+# Columns read from each transaction row, in the order parse_transactions
+# unpacks them
+ROW_COLUMNS = (
+    "Transaction Date", "Processed Date", "Type", "Details", "Particulars",
+    "Code", "Reference", "Amount", "Balance", "To/From Account Number",
+    "Conversion Charge", "Foreign Currency Amount",
+)
+
+# Currency symbol, thousands separators and spaces dropped from amounts
+AMOUNT_STRIP_TABLE = str.maketrans('', '', '$, ')
+
+
 class ExcelParser:
     """Parse bank transaction Excel files."""
     
@@ -16,10 +39,21 @@ class ExcelParser:
         "To/From Account Number", "Conversion Charge", "Foreign Currency Amount"
     ]
     
+    # Date formats tried by parse_date, in order
+    DATE_FORMATS = [
+        "%d %b %Y",      # "28 Nov 2025"
+        "%Y-%m-%d",      # "2025-11-28"
+        "%d/%m/%Y",      # "28/11/2025"
+        "%d-%m-%Y",      # "28-11-2025"
+    ]
+    
     def __init__(self, file_path: str):
         self.file_path = Path(file_path)
         self.workbook = None
         self.sheet = None
+        self._date_cache: Dict[str, Optional[datetime]] = {}  # Raw date text -> parsed date
+        self._date_formats = list(self.DATE_FORMATS)  # Last successful format first
+        self._headers: Optional[List] = None
         
     def parse_filename(self) -> Dict:
         """
@@ -46,9 +80,7 @@ class ExcelParser:
             "raw_filename": filename
         }
         
-        # Pattern to match: account_number_Transactions_date-from_date-to
-        pattern = r'^([\d-]+)_Transactions_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})$'
-        match = re.match(pattern, filename_stem)
+        match = FILENAME_PATTERN.match(filename_stem)
         
         if match:
             result["account_number"] = match.group(1)
@@ -56,8 +88,7 @@ class ExcelParser:
             result["date_to"] = datetime.strptime(match.group(3), "%Y-%m-%d").date()
         else:
             # Try to extract just account number (any format starting with digits and dashes)
-            account_pattern = r'^([\d]+-[\d]+-[\d]+-[\d]+)'
-            account_match = re.match(account_pattern, filename_stem)
+            account_match = ACCOUNT_NUMBER_PATTERN.match(filename_stem)
             if account_match:
                 result["account_number"] = account_match.group(1)
         
@@ -65,21 +96,35 @@ class ExcelParser:
     
     def load(self) -> bool:
         """Load the Excel file."""
+        # Imported on first use: only uploads need openpyxl, and it is a
+        # large share of the API's cold-start import time
+        from openpyxl import load_workbook
+        
         try:
-            self.workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+            # Streaming reader, cached values only, no external-link parts
+            self.workbook = load_workbook(
+                self.file_path, read_only=True, data_only=True, keep_links=False
+            )
             # Get the first sheet (usually named "Transactions")
             self.sheet = self.workbook.active
             return True
         except Exception as e:
             raise ValueError(f"Failed to load Excel file: {e}")
     
-    def validate_headers(self) -> Tuple[bool, List[str]]:
-        """Validate that the file has expected column headers."""
+    def read_headers(self) -> List:
+        """Values of the header row, read once via the streaming row iterator."""
         if not self.sheet:
             raise ValueError("File not loaded. Call load() first.")
         
+        if self._headers is None:
+            first_row = next(self.sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            self._headers = list(first_row)
+        return self._headers
+    
+    def validate_headers(self) -> Tuple[bool, List[str]]:
+        """Validate that the file has expected column headers."""
         # Read first row as headers
-        headers = [cell.value for cell in self.sheet[1]]
+        headers = self.read_headers()
         
         missing = []
         for expected in self.EXPECTED_HEADERS[:9]:  # First 9 are required
@@ -100,16 +145,15 @@ class ExcelParser:
         if not amount_str or amount_str == "":
             return 0.0
         
+        # Numeric cells come back from openpyxl already typed
+        if isinstance(amount_str, (int, float)):
+            return float(amount_str)
+        
         # Convert to string if not already
         amount_str = str(amount_str).strip()
         
-        # Remove currency symbol and spaces
-        cleaned = amount_str.replace("$", "").replace(",", "").replace(" ", "")
-        
-        # Handle "- " prefix for debits
-        if cleaned.startswith("-"):
-            cleaned = cleaned[1:]
-            return -float(cleaned)
+        # Remove currency symbol and spaces; "- $1" and "-$1" both become "-1"
+        cleaned = amount_str.translate(AMOUNT_STRIP_TABLE)
         
         return float(cleaned)
     
@@ -122,31 +166,34 @@ class ExcelParser:
         if isinstance(date_value, datetime):
             return date_value.date()
         
-        # Try common date formats
+        # Statements repeat the same dates many times; parse each text once
         date_str = str(date_value).strip()
-        formats = [
-            "%d %b %Y",      # "28 Nov 2025"
-            "%Y-%m-%d",      # "2025-11-28"
-            "%d/%m/%Y",      # "28/11/2025"
-            "%d-%m-%Y",      # "28-11-2025"
-        ]
-        
-        for fmt in formats:
+        if date_str in self._date_cache:
+            return self._date_cache[date_str]
+        
+        # Try common date formats. A file uses one format throughout, so
+        # the one that worked last time goes to the front.
+        parsed = None
+        for position, fmt in enumerate(self._date_formats):
             try:
-                return datetime.strptime(date_str, fmt).date()
+                parsed = datetime.strptime(date_str, fmt).date()
             except ValueError:
                 continue
+            if position:
+                self._date_formats.insert(0, self._date_formats.pop(position))
+            break
         
-        return None
+        self._date_cache[date_str] = parsed
+        return parsed
     
     def extract_card_last4(self, details: str) -> Optional[str]:
         """Extract last 4 digits of card from details field."""
-        if not details:
+        # Every match contains the masked middle, so most rows (transfers,
+        # direct debits) are rejected without running the regex
+        if not details or CARD_MASK not in details:
             return None
         
-        # Pattern: 4835-****-****-3704
-        pattern = r'\d{4}-\*{4}-\*{4}-(\d{4})'
-        match = re.search(pattern, details)
+        match = CARD_LAST4_PATTERN.search(details)
         
         if match:
             return match.group(1)
@@ -164,57 +211,71 @@ class ExcelParser:
         transactions = []
         
         # Get header row to map columns
-        headers = [cell.value for cell in self.sheet[1]]
+        headers = self.read_headers()
         header_map = {header: idx for idx, header in enumerate(headers) if header}
         
+        # Resolve every column once. Columns missing from the file point at
+        # a trailing slot that is always None; rows shorter than that are
+        # padded (read-only sheets may drop trailing empty cells).
+        width = len(headers) + 1
+        get_columns = itemgetter(*(
+            header_map.get(name, len(headers)) for name in ROW_COLUMNS
+        ))
+        
         # Parse each row (skip header)
         for row_num, row in enumerate(self.sheet.iter_rows(min_row=2, values_only=True), start=2):
             # Skip empty rows
             if not any(row):
                 continue
             
-            def get_value(column_name):
-                idx = header_map.get(column_name)
-                if idx is not None and idx < len(row):
-                    return row[idx]
-                return None
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            (
+                trans_date_raw, processed_date_raw, transaction_type, details,
+                particulars, code, reference, amount_raw, balance_raw,
+                to_from_account, conversion_charge, foreign_currency_amount,
+            ) = get_columns(row)
             
             # Parse transaction date
-            trans_date = self.parse_date(get_value("Transaction Date"))
+            trans_date = self.parse_date(trans_date_raw)
             if not trans_date:
                 continue  # Skip rows without valid date
             
             # Parse amount
-            amount_raw = get_value("Amount")
             try:
                 amount = self.parse_amount(amount_raw)
             except (ValueError, TypeError):
                 continue  # Skip rows with invalid amount
             
             # Parse balance
-            balance_raw = get_value("Balance")
             try:
                 balance = self.parse_amount(balance_raw) if balance_raw else None
             except (ValueError, TypeError):
                 balance = None
             
-            # Extract details
-            details = get_value("Details")
+            # Card number from details. Cells are usually already str; only
+            # coerce the odd numeric one for the lookup.
+            if not details:
+                card_last4 = None
+            elif isinstance(details, str):
+                card_last4 = self.extract_card_last4(details)
+            else:
+                card_last4 = self.extract_card_last4(str(details))
             
             transaction = {
                 "transaction_date": trans_date,
-                "processed_date": self.parse_date(get_value("Processed Date")),
-                "transaction_type": get_value("Type"),
+                "processed_date": self.parse_date(processed_date_raw),
+                "transaction_type": transaction_type,
                 "details": details,
-                "particulars": get_value("Particulars"),
-                "code": get_value("Code"),
-                "reference": get_value("Reference"),
+                "particulars": particulars,
+                "code": code,
+                "reference": reference,
                 "amount": amount,
                 "balance": balance,
-                "to_from_account": get_value("To/From Account Number"),
-                "conversion_charge": get_value("Conversion Charge"),
-                "foreign_currency_amount": get_value("Foreign Currency Amount"),
-                "card_number_last4": self.extract_card_last4(str(details) if details else ""),
+                "to_from_account": to_from_account,
+                "conversion_charge": conversion_charge,
+                "foreign_currency_amount": foreign_currency_amount,
+                "card_number_last4": card_last4,
                 "row_number": row_num  # For debugging/reference
             }
             
@@ -229,8 +290,10 @@ class ExcelParser:
         if not self.sheet:
             self.load()
         
-        transactions = self.parse_transactions()
-        
+        return self._summarize(file_info, self.parse_transactions())
+    
+    def _summarize(self, file_info: Dict, transactions: List[Dict]) -> Dict:
+        """Build the get_summary result from already-parsed transactions."""
         if not transactions:
             return {
                 **file_info,
@@ -240,23 +303,26 @@ class ExcelParser:
                 "closing_balance": None,
             }
         
-        # Transactions are typically in reverse chronological order (newest first)
-        # Sort by date to get proper range
-        sorted_trans = sorted(transactions, key=lambda x: x["transaction_date"])
+        # Transactions are typically in reverse chronological order (newest first).
+        # Same picks as a stable sort by date: the first row of the oldest
+        # day and the last row of the newest day.
+        date_key = itemgetter("transaction_date")
+        oldest = min(transactions, key=date_key)
+        newest = max(reversed(transactions), key=date_key)
         
         return {
             **file_info,
             "total_rows": len(transactions),
             "date_range": {
-                "from": sorted_trans[0]["transaction_date"],
-                "to": sorted_trans[-1]["transaction_date"]
+                "from": oldest["transaction_date"],
+                "to": newest["transaction_date"]
             },
             # Opening balance is the balance AFTER the oldest transaction
             # Closing balance is the balance AFTER the newest transaction
-            "oldest_transaction": sorted_trans[0],
-            "newest_transaction": sorted_trans[-1],
-            "opening_balance": sorted_trans[0]["balance"],
-            "closing_balance": sorted_trans[-1]["balance"],
+            "oldest_transaction": oldest,
+            "newest_transaction": newest,
+            "opening_balance": oldest["balance"],
+            "closing_balance": newest["balance"],
         }
     
     def close(self):
@@ -280,8 +346,9 @@ def parse_excel_file(file_path: str) -> Tuple[Dict, List[Dict]]:
         if not valid:
             raise ValueError(f"Missing required columns: {missing}")
         
-        summary = parser.get_summary()
+        # Parse the sheet once and summarize from the same rows
         transactions = parser.parse_transactions()
+        summary = parser._summarize(parser.parse_filename(), transactions)
         
         return summary, transactions
     finally:
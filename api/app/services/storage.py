@@ -4,6 +4,8 @@ Supports both local filesystem and Supabase Storage.
 """
 import os
 import logging
+import shutil
+import time
 from pathlib import Path
 from typing import Optional
 import tempfile
@@ -23,6 +25,9 @@ if USE_SUPABASE:
         logger.warning("Supabase package not installed. Using local storage.")
         USE_SUPABASE = False
 
+# How long a bucket listing is reused by file_exists before listing again
+LISTING_TTL_SECONDS = 30
+
 
 class StorageService:
     """Unified storage service for files and ML models."""
@@ -30,9 +35,17 @@ class StorageService:
     def __init__(self, bucket_name: str = "ml-models"):
         self.bucket_name = bucket_name
         self.use_supabase = USE_SUPABASE
+        # File names from the last bucket listing, and when it was taken
+        self._listing: Optional[set] = None
+        self._listed_at = 0.0
 
-        # Local storage fallback
-        if not self.use_supabase:
+        if self.use_supabase:
+            # One bucket handle per service: its storage client (and the
+            # HTTP connection pool inside it) is reused by every call.
+            # Older SDKs build a new storage client on each .storage access.
+            self._bucket = supabase_client.storage.from_(bucket_name)
+        else:
+            # Local storage fallback
             self.local_dir = Path(__file__).parent.parent.parent / "data" / bucket_name
             self.local_dir.mkdir(parents=True, exist_ok=True)
 
@@ -40,19 +53,23 @@ class StorageService:
         """Upload a file to storage."""
         try:
             if self.use_supabase:
+                # Pass the open file so the client streams it into the
+                # multipart body instead of holding a full copy in memory
                 with open(file_path, 'rb') as f:
-                    supabase_client.storage.from_(self.bucket_name).upload(
+                    self._bucket.upload(
                         destination_name,
-                        f.read(),
+                        f,
                         {"content-type": "application/octet-stream"}
                     )
+                if self._listing is not None:
+                    self._listing.add(destination_name)
                 logger.info(f"Uploaded {destination_name} to Supabase")
             else:
-                # Local copy
+                # Local copy (kernel-side via sendfile/copy_file_range where
+                # available, never read into Python memory)
                 dest_path = self.local_dir / destination_name
                 dest_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(file_path, 'rb') as src, open(dest_path, 'wb') as dst:
-                    dst.write(src.read())
+                shutil.copyfile(file_path, dest_path)
                 logger.info(f"Copied {destination_name} to local storage")
             return True
         except Exception as e:
@@ -63,7 +80,7 @@ class StorageService:
         """Download a file from storage."""
         try:
             if self.use_supabase:
-                response = supabase_client.storage.from_(self.bucket_name).download(source_name)
+                response = self._bucket.download(source_name)
                 logger.info(f"Downloaded {source_name} from Supabase")
                 return response
             else:
@@ -84,14 +101,22 @@ class StorageService:
         """Check if a file exists in storage."""
         try:
             if self.use_supabase:
-                files = supabase_client.storage.from_(self.bucket_name).list()
-                return any(f['name'] == file_name for f in files)
+                return file_name in self._list_names()
             else:
                 return (self.local_dir / file_name).exists()
         except Exception as e:
             logger.error(f"Failed to check if {file_name} exists: {e}")
             return False
 
+    def _list_names(self) -> set:
+        """Names of the files in the bucket, listed at most once per LISTING_TTL_SECONDS."""
+        now = time.monotonic()
+        if self._listing is None or now - self._listed_at > LISTING_TTL_SECONDS:
+            files = self._bucket.list()
+            self._listing = {f['name'] for f in files}
+            self._listed_at = now
+        return self._listing
+
     def get_temp_path(self, file_name: str) -> str:
         """Get a temporary file path for downloads."""
         temp_dir = Path(tempfile.gettempdir()) / "finance_portal"
@@ -0,0 +1,19 @@
+"""Work that runs after a request's main response is ready."""
+import os
+
+from fastapi import BackgroundTasks
+
+# Serverless platforms (Vercel sets VERCEL=1) may freeze an instance as soon
+# as its response is sent, losing anything scheduled after it, so there the
+# work runs before responding instead. RUN_TASKS_INLINE overrides this.
+RUN_TASKS_INLINE = os.getenv(
+    "RUN_TASKS_INLINE", "true" if os.getenv("VERCEL") else "false"
+).lower() == "true"
+
+
+def run_after_response(background_tasks: BackgroundTasks, func, *args):
+    """Run func(*args) once the response is sent, or right away when RUN_TASKS_INLINE."""
+    if RUN_TASKS_INLINE:
+        func(*args)
+    else:
+        background_tasks.add_task(func, *args)
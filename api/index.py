@@ -13,7 +13,7 @@ if str(api_dir) not in sys.path:
 from app.main import app
 from app.database import init_db
 
-# Initialize database tables
+# Migrates only if the database's schema version is behind (see app.migrate)
 try:
     init_db()
 except Exception as e:
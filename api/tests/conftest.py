@@ -0,0 +1,94 @@
+"""
+Shared test fixtures.
+
+Tests run against a throwaway SQLite database, or against the database
+in TEST_DATABASE_URL when set (e.g. a scratch PostgreSQL, to cover the
+ON CONFLICT import path). Every table is emptied between tests, so never
+point TEST_DATABASE_URL at a database holding real data.
+
+    cd api && pip install -r requirements-dev.txt && python -m pytest
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The engine is created when app.database is imported, so configure it first
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="finance_portal_tests_")
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(_TEST_DB_DIR, 'test.db')}"
+)
+os.environ.pop("ANTHROPIC_API_KEY", None)
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["BASIC_AUTH_USERNAME"] = "admin"
+os.environ["BASIC_AUTH_PASSWORD"] = "changeme"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import Base, SessionLocal, engine
+from app.main import app
+from app.migrate import migrate
+from app.models import Account, AccountType, Category
+from app.services import categorizer
+
+migrate()
+
+CATEGORIES = [
+    ("Food & Dining", False),
+    ("Groceries", False),
+    ("Transport", False),
+    ("Salary", True),
+    ("Other Expenses", False),
+    ("Other Income", True),
+]
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Empty every table and the process-wide caches before each test."""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    categorizer._rules_snapshot = (None, [], None)
+    categorizer._llm_cache.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def categories(db):
+    """The seeded categories, by name."""
+    db.add_all(Category(name=name, is_income=is_income) for name, is_income in CATEGORIES)
+    db.commit()
+    return {c.name: c for c in db.query(Category)}
+
+
+@pytest.fixture
+def account(db):
+    account = Account(
+        account_number="01-0183-0950462-00",
+        name="Everyday",
+        owner="Test",
+        account_type=AccountType.PERSONAL
+    )
+    db.add(account)
+    db.commit()
+    return account
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        test_client.auth = ("admin", "changeme")
+        yield test_client
@@ -0,0 +1,83 @@
+"""Categorization endpoints and merchant rule patterns."""
+from datetime import date
+
+import pytest
+
+from app.models import MerchantRule, Transaction, TransactionClassification
+from app.services.categorizer import has_nested_quantifier
+
+
+@pytest.fixture
+def rules(db, categories):
+    rules = [
+        MerchantRule(
+            merchant_pattern="acme", match_type="startswith",
+            classification=TransactionClassification.BUSINESS,
+            category_id=categories["Other Expenses"].id, confidence=0.9
+        ),
+        # Weekend-only, so it never matches the weekday rows below
+        MerchantRule(
+            merchant_pattern="widgets", match_type="contains",
+            classification=TransactionClassification.PERSONAL,
+            category_id=categories["Food & Dining"].id, confidence=0.95, day_of_week="weekend"
+        ),
+    ]
+    db.add_all(rules)
+    db.commit()
+    return rules
+
+
+def test_suggestions_use_matching_rules(client, db, account, categories, rules):
+    db.add_all([
+        Transaction(account_id=account.id, transaction_date=date(2025, 6, 2),
+                    details="ACME WIDGETS LTD", amount=-20.0),
+        Transaction(account_id=account.id, transaction_date=date(2025, 6, 3),
+                    details="QX VENDOR", amount=-5.0),
+    ])
+    db.commit()
+
+    items = {
+        item["transaction"]["details"]: item["suggestion"]
+        for item in client.get("/api/categorization/suggestions").json()["items"]
+    }
+
+    assert items["ACME WIDGETS LTD"]["source"] == "rule"
+    assert items["ACME WIDGETS LTD"]["category_name"] == "Other Expenses"
+    assert items["ACME WIDGETS LTD"]["classification"] == "business"
+    assert items["QX VENDOR"]["source"] != "rule"
+
+
+def test_suggestions_show_renamed_category_names(client, db, account, categories, rules):
+    db.add(Transaction(account_id=account.id, transaction_date=date(2025, 6, 2),
+                       details="ACME WIDGETS LTD", amount=-20.0))
+    db.commit()
+    client.get("/api/categorization/suggestions")
+
+    categories["Other Expenses"].name = "Sundries"
+    db.commit()
+
+    item = client.get("/api/categorization/suggestions").json()["items"][0]
+    assert item["suggestion"]["category_name"] == "Sundries"
+
+
+@pytest.mark.parametrize("pattern", [r"(a+)+", r"(\d+\s?)+", r"(a+|b)+", r"(a|aa)+", r"((a)+)+", r"(\w*)*"])
+def test_unsafe_regex_rules_are_rejected(pattern):
+    assert has_nested_quantifier(pattern)
+    with pytest.raises(ValueError):
+        MerchantRule(match_type="regex", merchant_pattern=pattern,
+                     classification=TransactionClassification.PERSONAL)
+
+
+@pytest.mark.parametrize("pattern", [r"countdown", r"^uber\s+trip", r"(?:new world|countdown)", r"(ab)+", r"z energy \d+"])
+def test_safe_regex_rules_are_accepted(pattern):
+    assert not has_nested_quantifier(pattern)
+    MerchantRule(match_type="regex", merchant_pattern=pattern,
+                 classification=TransactionClassification.PERSONAL)
+
+
+def test_unsafe_regex_rule_is_rejected_on_update():
+    rule = MerchantRule(merchant_pattern="(a+)+", match_type="contains",
+                        classification=TransactionClassification.PERSONAL)
+
+    with pytest.raises(ValueError):
+        rule.match_type = "regex"
@@ -0,0 +1,140 @@
+"""Chunk-batched LLM categorization (TransactionCategorizer.categorize_batch)."""
+import json
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import Transaction
+from app.services import categorizer
+from app.services.categorizer import TransactionCategorizer
+
+
+class FakeMessages:
+    """Stands in for anthropic_client.messages, answering the batch tool call."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        # Batch prompts carry the transactions as a JSON array; anything
+        # else is a single-row request, recorded as None
+        items = [json.loads(line) for line in prompt.splitlines() if line.startswith("[")]
+        ids = [item["transaction_id"] for item in items[0]] if items else None
+        with self._lock:
+            self.calls.append(ids)
+        if ids is None:
+            raise AssertionError("unexpected single-row request")
+        results = self.answer(ids)
+        return SimpleNamespace(content=[SimpleNamespace(type="tool_use", input={"results": results})])
+
+
+def answer(ids, category):
+    return [
+        {
+            "transaction_id": transaction_id,
+            "classification": "personal",
+            "category_id": category.id,
+            "category_name": category.name,
+            "confidence": 0.9
+        }
+        for transaction_id in ids
+    ]
+
+
+@pytest.fixture
+def transactions(db, account):
+    # Merchant names that no keyword rule matches, all distinct for the LLM cache
+    rows = [
+        Transaction(
+            account_id=account.id,
+            transaction_date=date(2025, 6, 1),
+            details=f"QX VENDOR {'Z' * (i + 1)}",
+            amount=-10.0
+        )
+        for i in range(7)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+@pytest.fixture
+def llm_categorizer(db, categories, monkeypatch):
+    """Categorizer with a fake Claude client, sending chunks of 3."""
+    monkeypatch.setattr(categorizer, "LLM_BATCH_SIZE", 3)
+
+    def build(answer):
+        instance = TransactionCategorizer(db, use_llm=False)
+        instance.use_llm = True
+        instance.anthropic_client = SimpleNamespace(messages=FakeMessages(answer))
+        return instance
+    return build
+
+
+def test_one_request_per_chunk(llm_categorizer, categories, transactions):
+    instance = llm_categorizer(lambda ids: answer(ids, categories["Groceries"]))
+
+    results = instance.categorize_batch(transactions)
+
+    calls = instance.anthropic_client.messages.calls
+    assert sorted(len(ids) for ids in calls) == [1, 3, 3]
+    assert sorted(i for ids in calls for i in ids) == sorted(t.id for t in transactions)
+    assert [r["transaction_id"] for r in results] == [t.id for t in transactions]
+    assert all(r["source"] == "llm" and r["category_name"] == "Groceries" for r in results)
+
+
+def test_ids_outside_the_chunk_are_ignored(llm_categorizer, categories, transactions):
+    all_ids = [t.id for t in transactions]
+
+    def answer_with_strays(ids):
+        # Every chunk also "answers" the other chunks' rows, an unknown id
+        # and a non-numeric one
+        strays = [i for i in all_ids if i not in ids] + [max(all_ids) + 100]
+        return (
+            answer(ids, categories["Groceries"])
+            + answer(strays, categories["Transport"])
+            + [{"transaction_id": "abc", "category_id": categories["Transport"].id}]
+        )
+
+    results = llm_categorizer(answer_with_strays).categorize_batch(transactions)
+
+    assert [r["transaction_id"] for r in results] == all_ids
+    assert all(r["category_name"] == "Groceries" for r in results)
+
+
+def test_failed_chunk_falls_back_without_per_row_calls(llm_categorizer, categories, transactions):
+    failing = transactions[0].id
+
+    def answer_or_fail(ids):
+        if failing in ids:
+            raise RuntimeError("overloaded")
+        return answer(ids, categories["Groceries"])
+
+    instance = llm_categorizer(answer_or_fail)
+    results = instance.categorize_batch(transactions)
+
+    failed_chunk = next(ids for ids in instance.anthropic_client.messages.calls if ids and failing in ids)
+    assert len(instance.anthropic_client.messages.calls) == 3
+    for result in results:
+        if result["transaction_id"] in failed_chunk:
+            assert result["source"] == "default"
+        else:
+            assert result["source"] == "llm"
+
+
+def test_rows_missing_from_an_answer_fall_back(llm_categorizer, categories, transactions):
+    dropped = transactions[-1].id
+    instance = llm_categorizer(
+        lambda ids: answer([i for i in ids if i != dropped], categories["Groceries"])
+    )
+
+    results = {r["transaction_id"]: r for r in instance.categorize_batch(transactions)}
+
+    assert len(instance.anthropic_client.messages.calls) == 3
+    assert results[dropped]["source"] == "default"
+    assert all(r["source"] == "llm" for i, r in results.items() if i != dropped)
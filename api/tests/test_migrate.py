@@ -0,0 +1,22 @@
+"""Startup schema migration (app.migrate.migrate_if_needed)."""
+import pytest
+
+from app import migrate
+
+
+def test_current_schema_is_not_migrated_again(monkeypatch):
+    assert migrate.schema_version() == migrate.SCHEMA_VERSION
+    monkeypatch.setattr(migrate, "migrate", lambda: pytest.fail("migrated a current schema"))
+
+    migrate.migrate_if_needed()
+
+
+def test_outdated_schema_is_migrated_at_startup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(migrate, "SCHEMA_VERSION", migrate.SCHEMA_VERSION + 1)
+    monkeypatch.setattr(migrate, "migrate", lambda: calls.append("migrate"))
+
+    migrate.migrate_if_needed()
+
+    assert calls == ["migrate"]
+
@@ -0,0 +1,27 @@
+"""Report and transaction summary totals."""
+from datetime import date
+
+from app.models import Transaction, TransactionClassification
+
+
+def test_report_and_transaction_summaries_agree(client, db, account):
+    db.add_all([
+        Transaction(account_id=account.id, transaction_date=date(2025, 6, 2), details="SALARY",
+                    amount=500.0, classification=TransactionClassification.PERSONAL),
+        Transaction(account_id=account.id, transaction_date=date(2025, 6, 3), details="COUNTDOWN",
+                    amount=-30.0, classification=TransactionClassification.PERSONAL),
+        Transaction(account_id=account.id, transaction_date=date(2025, 6, 4), details="ACME",
+                    amount=-10.0, classification=TransactionClassification.BUSINESS),
+    ])
+    db.commit()
+    params = {"date_from": "2025-06-01", "date_to": "2025-06-30"}
+
+    report = client.get("/api/reports/summary", params=params).json()
+    stats = client.get("/api/transactions/stats/summary", params=params).json()
+
+    assert report["total_transactions"] == stats["total_transactions"] == 3
+    assert report["total_income"] == stats["total_income"] == 500.0
+    assert report["total_expenses"] == -stats["total_expenses"] == 40.0
+    assert report["avg_expense"] == 20.0
+    assert stats["classification"] == {"unclassified": 0, "personal": 2, "business": 1}
+    assert stats["uncategorized_count"] == 2
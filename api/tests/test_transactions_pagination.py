@@ -0,0 +1,91 @@
+"""Keyset pagination of GET /api/transactions/."""
+import base64
+from datetime import date, timedelta
+
+import pytest
+
+from app.models import Transaction
+
+
+@pytest.fixture
+def transactions(db, account):
+    """25 transactions over 10 days, several sharing a date."""
+    rows = [
+        Transaction(
+            account_id=account.id,
+            transaction_date=date(2025, 6, 1) + timedelta(days=i % 10),
+            details=f"Merchant {i}",
+            amount=-float(i + 1)
+        )
+        for i in range(25)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def expected_order(rows):
+    return [t.id for t in sorted(rows, key=lambda t: (t.transaction_date, t.id), reverse=True)]
+
+
+def test_cursor_pages_follow_date_then_id_order(client, transactions):
+    seen = []
+    cursor = None
+    while True:
+        params = {"page_size": 10}
+        if cursor:
+            params["after"] = cursor
+        response = client.get("/api/transactions/", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == 25
+        seen.extend(t["id"] for t in body["transactions"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected_order(transactions)
+
+
+def test_cursor_matches_offset_pages(client, transactions):
+    first = client.get("/api/transactions/", params={"page_size": 10}).json()
+    by_cursor = client.get(
+        "/api/transactions/", params={"page_size": 10, "after": first["next_cursor"]}
+    ).json()
+    by_offset = client.get("/api/transactions/", params={"page_size": 10, "page": 2}).json()
+
+    assert [t["id"] for t in by_cursor["transactions"]] == [t["id"] for t in by_offset["transactions"]]
+
+
+def test_last_page_has_no_cursor(client, transactions):
+    body = client.get("/api/transactions/", params={"page_size": 30}).json()
+
+    assert len(body["transactions"]) == 25
+    assert body["next_cursor"] is None
+
+
+def test_cursor_respects_filters(client, transactions):
+    first = client.get(
+        "/api/transactions/", params={"page_size": 2, "date_from": "2025-06-09"}
+    ).json()
+    rest = client.get(
+        "/api/transactions/",
+        params={"page_size": 10, "date_from": "2025-06-09", "after": first["next_cursor"]}
+    ).json()
+
+    recent = [t for t in transactions if t.transaction_date >= date(2025, 6, 9)]
+    assert [t["id"] for t in first["transactions"] + rest["transactions"]] == expected_order(recent)
+
+
+@pytest.mark.parametrize("cursor", [
+    "zzz",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"2025-13-01|5").decode(),
+    base64.urlsafe_b64encode(b"2025-06-01|abc").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_malformed_cursor_returns_400(client, transactions, cursor):
+    response = client.get("/api/transactions/", params={"after": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,302 @@
+"""Upload preview/confirm: duplicate handling and background auto-categorization."""
+from datetime import date, datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+
+from app.models import ImportLog, MerchantRule, Transaction, TransactionClassification
+from app import tasks
+from app.routers import upload
+
+ACCOUNT_NUMBER = "01-0183-0950462-00"
+HEADER = [
+    "Transaction Date", "Processed Date", "Type", "Details", "Particulars", "Code",
+    "Reference", "Amount", "Balance", "To/From Account Number", "Conversion Charge",
+    "Foreign Currency Amount"
+]
+MERCHANTS = ["COUNTDOWN PONSONBY", "ACME WIDGETS LTD", "UBER TRIP", "BP CONNECT", "CORNER DAIRY"]
+
+
+def statement_rows(count, start=date(2025, 6, 1)):
+    """Bank export rows: one debit per day with a running balance."""
+    rows = []
+    balance = 1000.0
+    for i in range(count):
+        day = (start + timedelta(days=i)).strftime("%d %b %Y")
+        amount = 10.0 + i
+        balance -= amount
+        rows.append([
+            day, day, "Visa Purchase", MERCHANTS[i % len(MERCHANTS)], "p", "c", "r",
+            f"- ${amount:,.2f}", f"${balance:,.2f}", None, None, None
+        ])
+    return rows
+
+
+def write_statement(path, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def import_file(client, path, account_id, **params):
+    """Preview then confirm a statement into an existing account."""
+    filename = f"{ACCOUNT_NUMBER}_Transactions_2025-06-01_2025-06-30.xlsx"
+    with open(path, "rb") as f:
+        preview = client.post("/api/upload/preview", files={"file": (filename, f)})
+    assert preview.status_code == 200
+    file_id = preview.json()["file_info"]["filename"].split("|")[0]
+
+    response = client.post(
+        "/api/upload/confirm", params={"file_id": file_id, "account_id": account_id, **params}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_repeated_row_within_a_file_is_imported_once(client, db, account, tmp_path):
+    rows = statement_rows(5)
+    path = write_statement(tmp_path / "statement.xlsx", rows + [rows[0]])
+
+    result = import_file(client, path, account.id)
+
+    assert result["total_transactions"] == 6
+    assert result["new_transactions"] == 5
+    assert result["duplicate_transactions"] == 1
+    assert db.query(Transaction).count() == 5
+
+
+def test_genuine_repeat_purchases_are_kept(client, db, account, tmp_path):
+    # Two identical coffees on the same day: only the running balance differs
+    day = "01 Jun 2025"
+    rows = [
+        [day, day, "Visa Purchase", "CORNER CAFE", "p", "c", "r", "- $5.50", "$994.50", None, None, None],
+        [day, day, "Visa Purchase", "CORNER CAFE", "p", "c", "r", "- $5.50", "$989.00", None, None, None],
+    ]
+    path = write_statement(tmp_path / "statement.xlsx", rows)
+
+    result = import_file(client, path, account.id)
+
+    assert result["new_transactions"] == 2
+    assert result["duplicate_transactions"] == 0
+    assert sorted(t.balance for t in db.query(Transaction)) == [989.0, 994.5]
+
+
+def test_reimporting_a_file_adds_nothing(client, db, account, tmp_path):
+    path = write_statement(tmp_path / "statement.xlsx", statement_rows(5))
+    import_file(client, path, account.id)
+
+    result = import_file(client, path, account.id)
+
+    assert result["new_transactions"] == 0
+    assert result["duplicate_transactions"] == 5
+    assert db.query(Transaction).count() == 5
+
+
+def test_same_file_under_another_account_is_previewed_afresh(client, db, account, tmp_path):
+    path = write_statement(tmp_path / "statement.xlsx", statement_rows(5))
+    import_file(client, path, account.id)
+
+    other_number = "12-3456-7890123-00"
+    with open(path, "rb") as f:
+        preview = client.post("/api/upload/preview", files={
+            "file": (f"{other_number}_Transactions_2025-06-01_2025-06-30.xlsx", f)
+        }).json()
+
+    assert preview["previously_imported_at"] is None
+    assert preview["file_info"]["account_number"] == other_number
+    assert preview["existing_account"] is None
+
+
+def test_overlapping_file_imports_only_new_rows(client, db, account, tmp_path):
+    rows = statement_rows(8)
+    import_file(client, write_statement(tmp_path / "first.xlsx", rows[:5]), account.id)
+
+    result = import_file(client, write_statement(tmp_path / "second.xlsx", rows[3:]), account.id)
+
+    assert result["new_transactions"] == 3
+    assert result["duplicate_transactions"] == 2
+    assert db.query(Transaction).count() == 8
+
+
+def test_postgres_skips_existing_rows_on_conflict(client, db, account, tmp_path):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("ON CONFLICT dedup needs PostgreSQL (set TEST_DATABASE_URL)")
+    assert upload._has_dedup_index(db)
+
+    rows = statement_rows(4)
+    db.add(Transaction(
+        account_id=account.id,
+        transaction_date=date(2025, 6, 2),
+        details=rows[1][3],
+        amount=-11.0,
+        balance=979.0
+    ))
+    db.commit()
+
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", rows + [rows[2]]), account.id)
+
+    assert result["new_transactions"] == 3
+    assert result["duplicate_transactions"] == 2
+    assert db.query(Transaction).count() == 4
+
+
+@pytest.fixture
+def acme_rule(db, categories):
+    rule = MerchantRule(
+        merchant_pattern="acme widgets",
+        match_type="contains",
+        classification=TransactionClassification.BUSINESS,
+        category_id=categories["Other Expenses"].id,
+        confidence=0.9
+    )
+    db.add(rule)
+    db.commit()
+    return rule
+
+
+def test_auto_categorize_runs_after_the_response(client, db, account, acme_rule, tmp_path):
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", statement_rows(10)), account.id)
+
+    status = client.get(f"/api/upload/status/{result['batch_id']}").json()
+    assert status["status"] == "completed"
+    assert status["new_transactions"] == 10
+
+    acme = db.query(Transaction).filter(Transaction.details == "ACME WIDGETS LTD").all()
+    others = db.query(Transaction).filter(Transaction.details != "ACME WIDGETS LTD").all()
+    assert len(acme) == 2
+    assert all(t.category_id == acme_rule.category_id for t in acme)
+    assert all(t.classification == TransactionClassification.BUSINESS and t.is_reviewed for t in acme)
+    assert all(t.category_id is None and not t.is_reviewed for t in others)
+    db.refresh(acme_rule)
+    assert acme_rule.times_applied == 2
+
+
+def test_import_reports_categorizing_until_the_task_runs(client, db, account, acme_rule, tmp_path, monkeypatch):
+    run_task = upload._auto_categorize_task
+    scheduled = []
+    monkeypatch.setattr(upload, "_auto_categorize_task", scheduled.append)
+
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", statement_rows(5)), account.id)
+
+    assert scheduled == [result["batch_id"]]
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "categorizing"
+
+    run_task(result["batch_id"])
+
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "completed"
+    assert db.query(Transaction).filter(Transaction.category_id.isnot(None)).count() == 1
+
+
+
+def test_serverless_runs_auto_categorize_before_responding(client, db, account, acme_rule, tmp_path, monkeypatch):
+    monkeypatch.setattr(tasks, "RUN_TASKS_INLINE", True)
+    ran = []
+    run_task = upload._auto_categorize_task
+    monkeypatch.setattr(upload, "_auto_categorize_task", lambda batch_id: (ran.append(batch_id), run_task(batch_id)))
+
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", statement_rows(5)), account.id)
+
+    assert ran == [result["batch_id"]]
+    assert db.query(ImportLog).one().status == "completed"
+
+
+def test_stale_categorizing_import_is_recovered(client, db, account, acme_rule, tmp_path, monkeypatch):
+    # The task was lost, e.g. with a frozen serverless instance
+    run_task = upload._auto_categorize_task
+    monkeypatch.setattr(upload, "_auto_categorize_task", lambda batch_id: None)
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", statement_rows(5)), account.id)
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "categorizing"
+
+    monkeypatch.setattr(upload, "_auto_categorize_task", run_task)
+    db.query(ImportLog).update({ImportLog.imported_at: datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "completed"
+    assert db.query(Transaction).filter(Transaction.category_id.isnot(None)).count() == 1
+
+def test_import_without_auto_categorize_completes_immediately(client, db, account, acme_rule, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "_auto_categorize_task", lambda batch_id: pytest.fail("task scheduled"))
+
+    result = import_file(
+        client, write_statement(tmp_path / "statement.xlsx", statement_rows(5)), account.id,
+        auto_categorize=False
+    )
+
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "completed"
+    assert db.query(Transaction).filter(Transaction.category_id.isnot(None)).count() == 0
+
+
+def test_failed_auto_categorize_still_completes_the_import(client, db, account, acme_rule, tmp_path, monkeypatch):
+    def fail(db, batch_id):
+        raise RuntimeError("rules unavailable")
+    monkeypatch.setattr(upload, "_auto_categorize_batch", fail)
+
+    result = import_file(client, write_statement(tmp_path / "statement.xlsx", statement_rows(5)), account.id)
+
+    assert client.get(f"/api/upload/status/{result['batch_id']}").json()["status"] == "completed"
+    assert db.query(Transaction).count() == 5
+    assert db.query(ImportLog).one().new_transactions == 5
+
+
+def test_status_of_unknown_batch_is_404(client):
+    assert client.get("/api/upload/status/nope").status_code == 404
+
+
+@pytest.mark.parametrize("file_id", ["../../etc/passwd", "not-a-uuid", ""])
+def test_confirm_rejects_invalid_file_ids(client, account, file_id):
+    response = client.post("/api/upload/confirm", params={"file_id": file_id, "account_id": account.id})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid file ID"
+
+
+@pytest.mark.parametrize("file_id", ["not-a-uuid", "..%5C..%5Cwindows"])
+def test_cancel_rejects_invalid_file_ids(client, file_id):
+    response = client.delete(f"/api/upload/cancel/{file_id}")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid file ID"
+
+
+
+def test_invalid_dedup_index_falls_back_to_python_dedup(client, db, account, tmp_path, monkeypatch):
+    # A failed CREATE UNIQUE INDEX CONCURRENTLY leaves an INVALID index behind
+    monkeypatch.setattr(upload, "index_is_valid", lambda name: False)
+    monkeypatch.setattr(upload, "_dedup_index_ready", None)
+    assert not upload._has_dedup_index(db)
+
+    path = write_statement(tmp_path / "statement.xlsx", statement_rows(5))
+    import_file(client, path, account.id)
+    result = import_file(client, path, account.id)
+
+    assert result["new_transactions"] == 0
+    assert result["duplicate_transactions"] == 5
+    assert db.query(Transaction).count() == 5
+
+def test_postgres_migration_removes_only_exact_duplicates(db, account):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("The dedup index migration is PostgreSQL-only (set TEST_DATABASE_URL)")
+    from app import migrate
+
+    migrate._execute_autocommit(f"DROP INDEX IF EXISTS {migrate.DEDUP_INDEX}")
+    upload._dedup_index_ready = None
+    try:
+        def row(balance):
+            return Transaction(
+                account_id=account.id, transaction_date=date(2025, 6, 1),
+                details="CORNER CAFE", amount=-5.5, balance=balance
+            )
+        db.add_all([row(994.5), row(989.0), row(989.0)])
+        db.commit()
+
+        migrate.create_dedup_index(remove_duplicates=True)
+
+        assert sorted(t.balance for t in db.query(Transaction)) == [989.0, 994.5]
+    finally:
+        migrate.create_dedup_index(remove_duplicates=True)
+        upload._dedup_index_ready = None
+    assert migrate.index_is_valid(migrate.DEDUP_INDEX)